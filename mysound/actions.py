@@ -2,20 +2,81 @@
     on 1-channel and multi-channels data sources
 """
 
+import tempfile
+import weakref
+
+from collections import OrderedDict
+
+from mysound import fingerprint
+from mysound import graph
+from mysound import length
+from mysound.backend import current
+from mysound.time import to_samples
+
+SKIP_BLOCK_SIZE = 4096
+
+def _length(data):
+    """ Return the number of samples in a chunk of data, either from
+        a 1-channel or a multi-channels source
+    """
+    if data is None or len(data) == 0:
+        return 0
+
+    first = data[0]
+    return len(first) if hasattr(first, '__len__') else len(data)
+
+def _empty(data):
+    """ Return the value signaling an exhausted stream of the same kind
+        as _data_
+    """
+    if data is None or (len(data) and hasattr(data[0], '__len__')):
+        return None
+
+    return data[:0]
+
+def _multichannel(data):
+    return data is not None and len(data) > 0 and hasattr(data[0], '__len__')
+
+def _cut(data, start, stop):
+    """ Return the [start, stop) range of samples from a chunk of data
+    """
+    if _multichannel(data):
+        return [channel[start:stop] for channel in data]
+
+    return data[start:stop]
+
+def _concat(chunks):
+    """ Concatenate several chunks of data
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+
+    concat = current().concat
+    if _multichannel(chunks[0]):
+        return [concat(channel) for channel in zip(*chunks)]
+
+    return concat(chunks)
+
+def _eof(empty):
+    def read(count):
+        return empty, read
+
+    return length.tag(read, 0)
+
 def loop(source):
     """ Repeat forever the same source of data
     """
     def _loop(curr):
         def read(count):
             data, cont = curr(count)
-            if not data:
+            if not _length(data):
                 data, cont = source(count)
 
             return data, _loop(cont)
 
         return read
 
-    return _loop(source)
+    return fingerprint.tag(_loop(source), 'loop', sources=(source,))
 
 def pick(n, first, second):
     """ Read up to n data from the first source, then switch to the
@@ -32,15 +93,36 @@ def pick(n, first, second):
         data, cont = first(count)
         return data, pick(n-len(data), cont, second)
 
-    return read
+    if hasattr(first, 'skip') and hasattr(second, 'skip'):
+        read.skip = lambda k : pick(n-k, first.skip(k), second) if k < n else pick(0, first, second.skip(k-max(n, 0)))
+
+    if n <= 0:
+        length.tag(read, length.of(second))
+    elif length.of(first) is not None and length.of(first) < n:
+        # the first source ends before the switch, so does the stream
+        length.tag(read, length.of(first))
+    elif length.shortest((first, second)) is not None:
+        length.tag(read, n+length.of(second))
 
-def caching(source):
+    graph.tag(read, 'pick', n, sources=(first, second))
+    return fingerprint.tag(read, 'pick', n, sources=(first, second))
+
+def caching(source, max_bytes=None, spill_dir=None):
     """ This function cache (memoize) data from
         a source. It is mostly useful to avoid
         recalculation for computationaly expensive
         processors, or when working with stateful
         or otherwise non-idempotent data source
+
+        If _max_bytes_ is given, at most that amount of cached samples
+        are kept in memory. The least recently used chunks are spilled
+        to a temporary file (in _spill_dir_ if given) and transparently
+        reloaded when read again. See `_boundedCaching`.
     """
+    if max_bytes is not None:
+        store = _CacheStore(max_bytes, spill_dir)
+        return fingerprint.tag(_boundedCaching(source, store), 'caching', sources=(source,))
+
     cache = None
     cont = None
     loaded = False
@@ -59,7 +141,295 @@ def caching(source):
 
             return cache[offset:stop], at(stop)
 
+        total = length.of(source)
+        return length.tag(read, None if total is None else total-offset)
+
+    return fingerprint.tag(at(0), 'caching', sources=(source,))
+
+class _CachedChunk:
+    """ A chunk of data memoized by `_boundedCaching`
+    """
+    __slots__ = ('data', 'spilled', 'nchannels', 'nbytes', '__weakref__')
+
+    def __init__(self, data):
+        self.data = data
+        self.spilled = None
+        self.nchannels = len(data) if _multichannel(data) else None
+        self.nbytes = _length(data)*(self.nchannels or 1)*4
+
+class _CacheStore:
+    """ The memory budget, spill file and statistics shared by the
+        chunks of a bounded cache.
+
+        The regions of the spill file used by chunks that were garbage
+        collected are reused to spill new chunks.
+    """
+    def __init__(self, max_bytes, spill_dir):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_file = None
+        self.spill_size = 0
+        self.regions = {}
+        self.free = []
+        self.lru = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.spills = 0
+        self.reloads = 0
+
+    def register(self, chunk):
+        """ Register a new chunk held in memory
+        """
+        weakref.finalize(chunk, self.release, id(chunk), chunk.nbytes)
+        self.add(chunk)
+
+    def add(self, chunk):
+        """ Track a chunk held in memory, evicting older ones as needed
+        """
+        self.lru[id(chunk)] = weakref.ref(chunk)
+        self.nbytes += chunk.nbytes
+
+        while self.nbytes > self.max_bytes and len(self.lru) > 1:
+            key, ref = self.lru.popitem(last=False)
+            victim = ref()
+            if victim is not None:
+                self.nbytes -= victim.nbytes
+                self.spill(victim)
+
+    def release(self, key, nbytes):
+        """ Forget a chunk that was garbage collected
+        """
+        if self.lru.pop(key, None) is not None:
+            self.nbytes -= nbytes
+
+        region = self.regions.pop(key, None)
+        if region is not None:
+            self.free.append(region)
+
+    def get(self, chunk):
+        """ Return the data of a chunk, reloading them if they were spilled
+        """
+        if chunk.data is not None:
+            self.hits += 1
+            self.lru.move_to_end(id(chunk))
+            return chunk.data
+
+        self.reloads += 1
+        position, size = chunk.spilled
+        self.spill_file.seek(position)
+        channels = current().decode_float32(self.spill_file.read(size), chunk.nchannels or 1)
+
+        data = chunk.data = channels if chunk.nchannels else channels[0]
+        self.add(chunk)
+        return data
+
+    def allocate(self, size):
+        """ Return the position of a free region of _size_ bytes in the
+            spill file
+        """
+        for i, (position, available) in enumerate(self.free):
+            if available >= size:
+                if available > size:
+                    self.free[i] = (position+size, available-size)
+                else:
+                    del self.free[i]
+                return position
+
+        position = self.spill_size
+        self.spill_size += size
+        return position
+
+    def spill(self, chunk):
+        """ Write a chunk to the spill file and drop its in-memory data
+        """
+        if chunk.spilled is None:
+            if self.spill_file is None:
+                self.spill_file = tempfile.TemporaryFile(dir=self.spill_dir)
+
+            buffer = current().encode_float32(chunk.data if chunk.nchannels else [chunk.data])
+            position = self.allocate(len(buffer))
+            self.spill_file.seek(position)
+            self.spill_file.write(buffer)
+            chunk.spilled = self.regions[id(chunk)] = (position, len(buffer))
+            self.spills += 1
+
+        chunk.data = None
+
+def _boundedCaching(source, store):
+    """ Memoize data from a source, keeping at most `store.max_bytes` of
+        them in memory.
+
+        Each continuation exposes the store as its `stats` attribute,
+        giving access to the `hits`, `misses`, `spills` and `reloads`
+        counters.
+    """
+    chunk = None
+    cont = None
 
+    def at(offset):
+        def read(count):
+            nonlocal chunk, cont
+            if chunk is None:
+                data, cont = source(count)
+                cont = _boundedCaching(cont, store)
+                chunk = _CachedChunk(data)
+                store.misses += 1
+                if chunk.nbytes:
+                    store.register(chunk)
+            elif chunk.nbytes:
+                data = store.get(chunk)
+            else:
+                data = chunk.data
+
+            length = _length(data)
+            if not length:
+                return data, cont
+
+            stop = offset+count
+            if stop >= length:
+                return _cut(data, offset, length), cont
+
+            return _cut(data, offset, stop), at(stop)
+
+        read.stats = store
         return read
 
     return at(0)
+
+def skip(ctx, duration, source):
+    """ Discard the first samples of a source. The duration is expressed
+        in samples or using any of the `mysound.time` formats.
+
+        If the source supports it (like sources read from a file),
+        the skip is performed by seeking rather than by reading and
+        discarding data.
+    """
+    n = to_samples(ctx, duration)
+    result = _skip(n, source)
+    if result is source:
+        return source
+
+    return fingerprint.tag(result, 'skip', n, sources=(source,))
+
+def _skip(n, source):
+    if n <= 0:
+        return source
+
+    seek = getattr(source, 'skip', None)
+    if seek is not None:
+        return seek(n)
+
+    resolved = None
+
+    def read(count):
+        nonlocal resolved
+        if resolved is None:
+            remaining, cont = n, source
+            while remaining > 0:
+                seek = getattr(cont, 'skip', None)
+                if seek is not None:
+                    cont = seek(remaining)
+                    break
+
+                data, after = cont(min(remaining, SKIP_BLOCK_SIZE))
+                length = _length(data)
+                if not length:
+                    break
+
+                remaining -= length
+                cont = after
+
+            resolved = cont
+
+        return resolved(count)
+
+    total = length.of(source)
+    return length.tag(read, None if total is None else total-n)
+
+def truncate(ctx, duration, source):
+    """ Keep only the first samples of a source. The duration is expressed
+        in samples or using any of the `mysound.time` formats.
+    """
+    n = to_samples(ctx, duration)
+    return fingerprint.tag(_truncate(n, source), 'truncate', n, sources=(source,))
+
+def _truncate(n, source):
+    def read(count):
+        if n <= 0:
+            data, _ = source(1)
+            return _eof(_empty(data))(count)
+
+        data, cont = source(min(count, n))
+        length = _length(data)
+        if not length:
+            return data, cont
+
+        if length < n:
+            return data, _truncate(n-length, cont)
+
+        return data, _eof(_empty(data))
+
+    if hasattr(source, 'skip'):
+        read.skip = lambda k : _truncate(n-k, source.skip(k))
+
+    total = length.of(source)
+    return length.tag(read, None if total is None else min(n, total))
+
+def slice(ctx, start, stop, source):
+    """ Keep only the samples of a source in the [start, stop) range. Both bounds
+        are expressed in samples or using any of the `mysound.time` formats.
+    """
+    start = to_samples(ctx, start)
+    stop = to_samples(ctx, stop)
+    assert start <= stop, "The start of a slice must not be after its stop"
+
+    return fingerprint.tag(_truncate(stop-start, _skip(start, source)), 'slice', start, stop, sources=(source,))
+
+def rechunk(source, blocksize):
+    """ Coalesce the data from a source into blocks of _blocksize_ samples.
+
+        Data are concatenated across the upstream chunk boundaries, so
+        a read returns exactly `min(count, blocksize)` samples, except
+        at the end of the stream.
+    """
+    return fingerprint.tag(_rechunk(source, blocksize, None, 0), 'rechunk', sources=(source,))
+
+def _rechunk(source, blocksize, pending, offset):
+    def read(count=blocksize):
+        n = min(count, blocksize)
+
+        chunks = []
+        length = 0
+        if pending is not None:
+            chunks.append(_cut(pending, offset, _length(pending)))
+            length = _length(pending)-offset
+
+        data, cont = None, source
+        while length < n:
+            data, cont = cont(blocksize)
+            size = _length(data)
+            if not size:
+                break
+
+            chunks.append(data)
+            length += size
+
+        if not length:
+            return data, cont
+
+        if length <= n:
+            return _concat(chunks), _rechunk(cont, blocksize, None, 0)
+
+        # keep the extra samples of the last chunk for the next block
+        last = chunks[-1]
+        split = _length(last)-(length-n)
+        chunks[-1] = _cut(last, 0, split)
+
+        return _concat(chunks), _rechunk(cont, blocksize, last, split)
+
+    total = length.of(source)
+    if total is not None and pending is not None:
+        total += _length(pending)-offset
+
+    return length.tag(read, total)
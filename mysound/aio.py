@@ -0,0 +1,81 @@
+""" asyncio interface to `mysound`
+
+    Reading samples from a file, decoding and encoding them are blocking
+    operations. The coroutines in this module offload them to an executor
+    (by default, the event loop's default executor), so a single event loop
+    can serve many concurrent renders without stalling.
+"""
+
+import asyncio
+
+from functools import partial
+
+import mysound.fileformats as fileformats
+import mysound.sink as sinks
+
+from mysound.backend import Constant
+from mysound.fileformats import wave
+from mysound.multichannel import mux
+
+BLOCK_SIZE = 10*1024
+
+async def _run(executor, fct, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(fct, *args, **kwargs))
+
+async def read(source, count, *, executor=None):
+    """ Awaitable version of `source(count)`.
+
+        Return the next chunk of data from _source_ and its continuation.
+    """
+    return await _run(executor, source, count)
+
+async def source(*args, executor=None, **kwargs):
+    """ Awaitable version of `mysound.fileformats.source`
+    """
+    return await _run(executor, fileformats.source, *args, **kwargs)
+
+async def sink(ctx, src, *args, executor=None, **kwargs):
+    """ Awaitable version of `mysound.sink.sink`
+    """
+    return await _run(executor, sinks.sink, ctx, src, *args, **kwargs)
+
+def _encodeNext(src, encoder, count):
+    data, src = src(count)
+    if not data:
+        return None, 0, src
+
+    return encoder(data), len(data[0]), src
+
+async def stream(ctx, src, *, wBitsPerSample=32, format=None, nFrames=None, blocksize=BLOCK_SIZE, executor=None):
+    """ Asynchronous generator yielding the content of a Wav file holding
+        the channels of _src_, chunk by chunk.
+
+        If _nFrames_ is given, the header holds the final sizes, and exactly
+        _nFrames_ samples per channel are produced (the channels are padded
+        with silence if they are shorter). Otherwise, the header uses the
+        "unknown length" sizes, and samples are produced until at least one
+        channel is exhausted.
+    """
+    if format is None:
+        format = wave.WAVE_FORMAT_IEEE_FLOAT
+
+    nChannels = len(src)
+    encoder = wave.ENCODERS[format, wBitsPerSample][0]
+    yield wave.header(ctx.srate, wBitsPerSample, nChannels, format=format, nFrames=nFrames)
+
+    src = mux(*src, fill=True)
+    remaining = nFrames
+    while remaining is None or remaining > 0:
+        count = blocksize if remaining is None else min(blocksize, remaining)
+        data, length, src = await _run(executor, _encodeNext, src, encoder, count)
+        if not length:
+            break
+
+        if remaining is not None:
+            remaining -= length
+        yield data
+
+    if remaining:
+        padding = [Constant(0.0, remaining)]*nChannels
+        yield await _run(executor, encoder, padding)
@@ -0,0 +1,718 @@
+""" Sample storage backends
+
+    By default, `mysound` stores samples in Python `array('f')` buffers
+    and processes them using pure Python code. When NumPy is available,
+    the `numpy` backend can be selected instead: channels then carry
+    `numpy.ndarray` blocks, and the hot primitives (decoding, encoding,
+    mixing, ramps and constants) use vectorized code.
+
+    The backend is selected at runtime using `use`, or by setting the
+    `MYSOUND_BACKEND` environment variable before importing `mysound`.
+    If NumPy is missing, `mysound` falls back to the pure Python backend.
+"""
+
+import itertools
+import math
+import operator
+import os
+import sys
+
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+PYTHON = "python"
+NUMPY = "numpy"
+
+# Array typecodes for the native integer types matching sample sizes
+_ARRAY_FLOAT32 = 'f'
+_ARRAY_UINT8 = 'B'
+_ARRAY_INT16 = 'h'
+_ARRAY_INT32 = 'i' if array('i').itemsize == 4 else 'l'
+_NATIVE_LE = sys.byteorder == 'little'
+
+# Lookup table for unsigned 8 bits samples
+_UINT8_TABLE = array('f', [(n-128)/128 for n in range(256)])
+
+def _frombytes(typecode, buffer):
+    """ Reinterpret a little-endian buffer as an array of native values.
+
+        _buffer_ can be any bytes-like object, including a memoryview.
+    """
+    result = array(typecode)
+    result.frombytes(buffer)
+    if not _NATIVE_LE:
+        result.byteswap()
+
+    return result
+
+def _tobytes(data):
+    """ Return the little-endian representation of an array.
+    """
+    if not _NATIVE_LE:
+        data = array(data.typecode, data)
+        data.byteswap()
+
+    return data.tobytes()
+
+def _widen24(buffer):
+    """ Widen a buffer of 24 bits little-endian samples to 32 bits by
+        inserting a null least significant byte. The resulting values are
+        the original ones scaled by 256.
+    """
+    n = len(buffer)//3
+    widened = bytearray(4*n)
+    widened[1::4] = buffer[0:3*n:3]
+    widened[2::4] = buffer[1:3*n:3]
+    widened[3::4] = buffer[2:3*n:3]
+
+    return widened
+
+def _narrow24(buffer):
+    """ Narrow a buffer of 32 bits little-endian integers to 24 bits by
+        dropping their most significant byte.
+    """
+    n = len(buffer)//4
+    narrowed = bytearray(3*n)
+    narrowed[0::3] = buffer[0::4]
+    narrowed[1::3] = buffer[1::4]
+    narrowed[2::3] = buffer[2::4]
+
+    return narrowed
+
+def _deinterleave(data, nChannels):
+    """ Split an interleaved buffer of samples in _nChannels_ buffers.
+    """
+    if nChannels == 1:
+        return [data]
+
+    return [data[c::nChannels] for c in range(nChannels)]
+
+def _interleave(typecode, channels):
+    """ Interleave the samples of several channels into one preallocated array.
+        Channels are truncated to the length of the shortest one.
+    """
+    nChannels = len(channels)
+    if nChannels == 1:
+        return channels[0]
+
+    n = min(map(len, channels))
+    result = array(typecode, bytes(array(typecode).itemsize*n*nChannels))
+    for c, channel in enumerate(channels):
+        result[c::nChannels] = channel[:n]
+
+    return result
+
+def _scale(samples, amp, offset, mn, mx):
+    """ Scale, offset and clip a sequence of float samples to the [mn, mx]
+        integer range.
+    """
+    return [mn if v < mn else mx if v > mx else int(v) for v in (x*amp+offset for x in samples)]
+
+class Constant:
+    """ A chunk of _n_ samples all having the same _value_
+
+        Constant chunks are produced by `generator.constant` and
+        `generator.silence`. They can be read, iterated and sliced like
+        any other chunk without allocating the samples, and the
+        primitives below (concatenation, mixing, encoding) process
+        them once per chunk instead of once per sample. `expand` returns
+        the equivalent array when a consumer really needs one.
+    """
+    __slots__ = ('value', 'n')
+    __hash__ = None
+
+    def __init__(self, value, n):
+        # Round the value to single precision, like samples stored in an array
+        self.value = array(_ARRAY_FLOAT32, (value,))[0]
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        return itertools.repeat(self.value, self.n)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return Constant(self.value, len(range(self.n)[key]))
+
+        range(self.n)[key] # raise IndexError if out of range
+        return self.value
+
+    def __eq__(self, other):
+        try:
+            return len(other) == self.n and all(v == self.value for v in other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return "Constant({!r}, {!r})".format(self.value, self.n)
+
+    def __array__(self, dtype=None, copy=None):
+        return numpy.full(self.n, self.value, dtype=dtype or numpy.float32)
+
+    def expand(self):
+        """ Return the samples of this chunk as an array of the current backend
+        """
+        return current().constant(self.value, self.n)
+
+def constants(chunks):
+    """ Return the values of _chunks_ if they are all `Constant`, `None` otherwise
+    """
+    if chunks and all(type(c) is Constant for c in chunks):
+        return [c.value for c in chunks]
+
+    return None
+
+def _joinConstants(chunks):
+    """ Return the concatenation of _chunks_ as a single `Constant` if they
+        all hold the same value, `None` otherwise
+    """
+    values = constants(chunks)
+    if values is None or values.count(values[0]) != len(values):
+        return None
+
+    return Constant(values[0], sum(map(len, chunks)))
+
+def _scaleChannel(typecode, samples, amp, offset, mn, mx):
+    """ Scale a channel of samples to an array of integers (see `_scale`)
+    """
+    if type(samples) is Constant:
+        return array(typecode, _scale((samples.value,), amp, offset, mn, mx))*len(samples)
+
+    return array(typecode, _scale(samples, amp, offset, mn, mx))
+
+#
+# Integer samples are converted to float using a power of two amplitude
+# (see the `mysound.fileformats.wave` module). So multiplying by its
+# inverse gives exactly the same result as dividing by it.
+#
+def _amplitude(width):
+    return 1<<width*8-1
+
+#
+# Pure Python FFT. The bit-reversal permutations and the twiddle factors
+# only depend on the transform size, so they are computed once per size.
+#
+_FFT_TABLES = {}
+
+def _fftTables(n):
+    tables = _FFT_TABLES.get(n)
+    if tables is None:
+        bits = n.bit_length()-1
+        if n != 1<<bits:
+            raise ValueError("The FFT size must be a power of two: {}".format(n))
+
+        permutation = [int(format(i, '0{}b'.format(bits))[::-1], 2) if bits else 0 for i in range(n)]
+        twiddles = [complex(math.cos(2*math.pi*k/n), -math.sin(2*math.pi*k/n)) for k in range(n//2)]
+        tables = _FFT_TABLES[n] = (permutation, twiddles)
+
+    return tables
+
+def _fft(x, inverse=False):
+    """ In-order radix-2 FFT of a sequence of complex numbers. The inverse
+        transform is not normalized.
+    """
+    n = len(x)
+    permutation, twiddles = _fftTables(n)
+    a = [x[i] for i in permutation]
+    if inverse:
+        twiddles = [w.conjugate() for w in twiddles]
+
+    half = 1
+    while half < n:
+        size = 2*half
+        w = twiddles[::n//size]
+        for start in range(0, n, size):
+            for k in range(half):
+                i = start+k
+                t = w[k]*a[i+half]
+                u = a[i]
+                a[i] = u+t
+                a[i+half] = u-t
+
+        half = size
+
+    return a
+
+def _rfft(x, n):
+    """ Return the n//2+1 first bins of the FFT of the real sequence _x_
+        zero-padded to _n_ samples.
+
+        The transform is computed using a complex FFT of half the size.
+    """
+    m = n//2
+    x = list(x[:n])
+    x.extend([0.0]*(n-len(x)))
+    z = _fft([complex(a, b) for a, b in zip(x[0::2], x[1::2])])
+    twiddles = _fftTables(n)[1]
+
+    result = []
+    for k in range(m+1):
+        zk = z[k%m]
+        zc = z[-k%m].conjugate()
+        w = twiddles[k] if k < m else -1.0
+        result.append((zk+zc)/2 + w*(zk-zc)/2j)
+
+    return result
+
+def _irfft(spectrum, n):
+    """ Inverse of `_rfft`: return the _n_ real samples whose spectrum is given
+    """
+    m = n//2
+    twiddles = _fftTables(n)[1]
+    z = []
+    for k in range(m):
+        xk = spectrum[k]
+        xc = spectrum[m-k].conjugate()
+        z.append((xk+xc) + 1j*twiddles[k].conjugate()*(xk-xc))
+
+    z = _fft(z, inverse=True)
+    scale = 0.5/m
+    result = [0.0]*n
+    result[0::2] = [v.real*scale for v in z]
+    result[1::2] = [v.imag*scale for v in z]
+
+    return result
+
+#
+# Wavetable oscillators
+#
+# Number of samples between two exact phase computations in `oscillators`
+OSCILLATOR_BLOCK_SIZE = 256
+
+_SLOPES = {}
+
+def _slope(table):
+    """ Return the differences between consecutive samples of a wavetable.
+        They are computed once per table.
+    """
+    entry = _SLOPES.get(id(table))
+    if entry is None or entry[0] is not table:
+        entry = _SLOPES[id(table)] = (table, [b-a for a, b in zip(table, table[1:])])
+
+    return entry[1]
+
+class PythonBackend:
+    """ Pure Python backend storing samples in `array('f')` buffers
+    """
+    name = PYTHON
+
+    def samples(self, values=()):
+        return array(_ARRAY_FLOAT32, values)
+
+    def constant(self, value, n):
+        return array(_ARRAY_FLOAT32, (value,))*n
+
+    def concat(self, chunks):
+        chunks = list(chunks)
+        joined = _joinConstants(chunks)
+        if joined is not None:
+            return joined
+
+        result = array(_ARRAY_FLOAT32)
+        for chunk in chunks:
+            result.extend(chunk)
+
+        return result
+
+    def zeros(self, n):
+        """ Return a new array of _n_ null samples, to be filled using `assign`
+        """
+        return array(_ARRAY_FLOAT32, bytes(4*n))
+
+    def assign(self, buffer, offset, data):
+        """ Copy the samples of _data_ into _buffer_, starting at _offset_
+        """
+        if not (isinstance(data, array) and data.typecode == _ARRAY_FLOAT32):
+            data = array(_ARRAY_FLOAT32, data)
+
+        buffer[offset:offset+len(data)] = data
+
+    def ramp(self, start, amplitude, first, n, count):
+        """ Return the samples _first_ to _first+n_ of a _count_ samples
+            ramp starting at _start_
+        """
+        return array(_ARRAY_FLOAT32, [start + (first+i)/(count-1)*amplitude for i in range(n)])
+
+    def mean(self, chunk):
+        """ Return the arithmetic average of several channels
+        """
+        nchannels = len(chunk)
+        fsum = math.fsum
+        values = constants(chunk)
+        if values is not None:
+            return Constant(fsum(values)/nchannels, len(chunk[0]))
+
+        return array(_ARRAY_FLOAT32, [fsum(vector)/nchannels for vector in zip(*chunk)])
+
+    def mix(self, chunk, gains, precise=False):
+        """ Return the linear combinations of the channels of _chunk_ whose
+            coefficients are given by the rows of the _gains_ matrix.
+
+            Zero coefficients are skipped. If _precise_ is true, the sums
+            are computed using `math.fsum`.
+        """
+        n = min(map(len, chunk))
+        return [self._mixRow([(g, c) for g, c in zip(row, chunk) if g], n, precise) for row in gains]
+
+    def _mixRow(self, terms, n, precise):
+        if not terms:
+            return Constant(0.0, n)
+
+        total = math.fsum if precise else sum
+        values = constants([c for g, c in terms])
+        if values is not None:
+            return Constant(total(g*v for (g, c), v in zip(terms, values)), n)
+
+        if precise:
+            fsum = math.fsum
+            return array(_ARRAY_FLOAT32, [fsum(v) for v in zip(*[map(g.__mul__, c) for g, c in terms])])
+
+        g, c = terms[0]
+        acc = map(g.__mul__, c)
+        for g, c in terms[1:]:
+            acc = map(operator.add, acc, map(g.__mul__, c))
+
+        return array(_ARRAY_FLOAT32, itertools.islice(acc, n))
+
+    def rfft(self, samples, n):
+        """ Return the spectrum of _samples_ zero-padded to _n_ samples
+            (a power of two), as its n//2+1 first bins.
+        """
+        return _rfft(samples, n)
+
+    def window(self, values):
+        """ Return an analysis window holding _values_, in the double
+            precision format used by `spectrum`
+        """
+        return array('d', values)
+
+    def spectrum(self, frame, window, n, magnitude=False):
+        """ Return the spectrum (n//2+1 bins) of _frame_ multiplied by _window_
+            and zero-padded to _n_ samples. If _magnitude_ is true, return the
+            magnitudes of the bins instead of the complex values.
+        """
+        spectrum = _rfft(list(map(operator.mul, frame, window)), n)
+        if magnitude:
+            return array('d', map(abs, spectrum))
+
+        return spectrum
+
+    def convolve_block(self, spectra, kernels, overlap):
+        """ One step of an overlap-add convolution.
+
+            Sum the products of the _spectra_ and _kernels_ (skipping the
+            `None` spectra), transform the result back, and add the
+            _overlap_ of the previous step to its first half.
+
+            Return the len(overlap) output samples and the new overlap.
+        """
+        size = len(overlap)
+        mul = operator.mul
+        acc = None
+        for spectrum, kernel in zip(spectra, kernels):
+            if spectrum is not None:
+                products = map(mul, spectrum, kernel)
+                acc = list(products) if acc is None else list(map(operator.add, acc, products))
+
+        if acc is None:
+            return array(_ARRAY_FLOAT32, overlap), [0.0]*size
+
+        y = _irfft(acc, 2*size)
+        return array(_ARRAY_FLOAT32, map(operator.add, y[:size], overlap)), y[size:]
+
+    def polyphase(self, samples, phases, starts, indices):
+        """ Apply a bank of FIR filters to _samples_. The output sample _i_ is
+            the dot product of the filter `phases[indices[i]]` and the samples
+            starting at `starts[i]`.
+        """
+        samples = list(samples)
+        width = len(phases[0])
+        mul = operator.mul
+        return array(_ARRAY_FLOAT32, [sum(map(mul, phases[p], samples[s:s+width])) for s, p in zip(starts, indices)])
+
+    def oscillators(self, table, partials, first, n):
+        """ Return the samples _first_ to _first+n_ of the sum of several
+            oscillators reading _table_ (a one-period wavetable, with an extra
+            guard sample equal to the first one).
+
+            _partials_ is a sequence of (increment, amplitude, phase) tuples,
+            increments and phases being expressed in periods.
+        """
+        size = len(table)-1
+        slope = _slope(table)
+        result = None
+        for increment, amplitude, phase in partials:
+            step = increment % 1.0 * size
+            values = []
+            append = values.append
+            k = first
+            stop = first+n
+            while k < stop:
+                # The table is walked with a phase accumulator, restarted from
+                # the exact phase at fixed positions, so the samples don't
+                # depend on the chunk boundaries
+                start = k - k%OSCILLATOR_BLOCK_SIZE
+                x = (phase + start*increment) % 1.0 * size
+                if x >= size:
+                    # a tiny negative phase rounds up to a full period
+                    x -= size
+
+                for _ in range(k-start):
+                    x += step
+                    if x >= size:
+                        x -= size
+
+                for _ in range(min(start+OSCILLATOR_BLOCK_SIZE, stop)-k):
+                    j = int(x)
+                    append(amplitude*(table[j] + (x-j)*slope[j]))
+                    x += step
+                    if x >= size:
+                        x -= size
+
+                k = min(start+OSCILLATOR_BLOCK_SIZE, stop)
+
+            result = values if result is None else list(map(operator.add, result, values))
+
+        return array(_ARRAY_FLOAT32, result if result is not None else [0.0]*n)
+
+    def decode_uint8(self, buffer, nChannels):
+        return _deinterleave(array(_ARRAY_FLOAT32, map(_UINT8_TABLE.__getitem__, buffer)), nChannels)
+
+    def decode_int(self, buffer, width, nChannels):
+        if width == 2:
+            data = _frombytes(_ARRAY_INT16, buffer)
+        elif width == 3:
+            data = _frombytes(_ARRAY_INT32, _widen24(buffer))
+            width = 4
+        elif width == 4:
+            data = _frombytes(_ARRAY_INT32, buffer)
+        else:
+            raise TypeError("Unsupported sample size: {} bytes".format(width))
+
+        scale = 1.0/_amplitude(width)
+        return _deinterleave(array(_ARRAY_FLOAT32, map(scale.__mul__, data)), nChannels)
+
+    def decode_float32(self, buffer, nChannels):
+        return _deinterleave(_frombytes(_ARRAY_FLOAT32, buffer), nChannels)
+
+    def encode_uint8(self, channels):
+        channels = [_scaleChannel(_ARRAY_UINT8, s, 128.0, 128.0, 0, 255) for s in channels]
+        return _interleave(_ARRAY_UINT8, channels).tobytes()
+
+    def encode_int(self, channels, width):
+        amp = float(_amplitude(width))
+        mn = int(-amp)
+        mx = int(amp-1)
+
+        typecode = _ARRAY_INT16 if width == 2 else _ARRAY_INT32
+        channels = [_scaleChannel(typecode, s, amp, 0.0, mn, mx) for s in channels]
+        data = _tobytes(_interleave(typecode, channels))
+
+        if width == 3:
+            data = _narrow24(data)
+
+        return data
+
+    def encode_float32(self, channels):
+        channels = [
+            s if isinstance(s, array) and s.typecode == _ARRAY_FLOAT32
+            else array(_ARRAY_FLOAT32, (s.value,))*len(s) if type(s) is Constant
+            else array(_ARRAY_FLOAT32, s)
+                for s in channels
+        ]
+        return _tobytes(_interleave(_ARRAY_FLOAT32, channels))
+
+class NumpyBackend(PythonBackend):
+    """ NumPy backend storing samples in `numpy.ndarray` blocks
+
+        Intermediate computations are performed using double precision
+        floats, so the results are the same as with the Python backend,
+        except for `mean` which does not use `math.fsum`.
+    """
+    name = NUMPY
+
+    def samples(self, values=()):
+        if isinstance(values, (numpy.ndarray, array, list, tuple)):
+            return numpy.array(values, dtype=numpy.float32)
+
+        return numpy.fromiter(values, dtype=numpy.float32)
+
+    def constant(self, value, n):
+        return numpy.full(n, value, dtype=numpy.float32)
+
+    def concat(self, chunks):
+        chunks = list(chunks)
+        joined = _joinConstants(chunks)
+        if joined is not None:
+            return joined
+
+        if not chunks:
+            return self.samples()
+
+        return numpy.concatenate(chunks).astype(numpy.float32, copy=False)
+
+    def zeros(self, n):
+        return numpy.zeros(n, dtype=numpy.float32)
+
+    def assign(self, buffer, offset, data):
+        buffer[offset:offset+len(data)] = numpy.asarray(data, dtype=numpy.float32)
+
+    def ramp(self, start, amplitude, first, n, count):
+        indices = numpy.arange(first, first+n, dtype=numpy.float64)
+        return (start + indices/(count-1)*amplitude).astype(numpy.float32)
+
+    def mean(self, chunk):
+        values = constants(chunk)
+        if values is not None:
+            return Constant(sum(values)/len(chunk), len(chunk[0]))
+
+        data = self._stack(chunk, numpy.float64, axis=0)
+        return (numpy.add.reduce(data, axis=0)/len(chunk)).astype(numpy.float32)
+
+    def _mixRow(self, terms, n, precise):
+        if precise or not terms or constants([c for g, c in terms]) is not None:
+            # the Python implementation works on Python floats
+            terms = [(g, c.tolist() if isinstance(c, numpy.ndarray) else c) for g, c in terms]
+            result = super()._mixRow(terms, n, precise)
+            return result if type(result) is Constant else self.samples(result)
+
+        acc = numpy.zeros(n, dtype=numpy.float64)
+        for g, c in terms:
+            acc += g*numpy.asarray(c[:n], dtype=numpy.float64)
+
+        return acc.astype(numpy.float32)
+
+    def rfft(self, samples, n):
+        return numpy.fft.rfft(numpy.asarray(samples, dtype=numpy.float64), n)
+
+    def window(self, values):
+        return numpy.fromiter(values, dtype=numpy.float64)
+
+    def spectrum(self, frame, window, n, magnitude=False):
+        spectrum = numpy.fft.rfft(numpy.asarray(frame, dtype=numpy.float64)*window, n)
+        if magnitude:
+            return numpy.abs(spectrum)
+
+        return spectrum
+
+    def convolve_block(self, spectra, kernels, overlap):
+        size = len(overlap)
+        acc = None
+        for spectrum, kernel in zip(spectra, kernels):
+            if spectrum is not None:
+                products = numpy.asarray(spectrum)*kernel
+                acc = products if acc is None else acc+products
+
+        overlap = numpy.asarray(overlap, dtype=numpy.float64)
+        if acc is None:
+            return overlap.astype(numpy.float32), numpy.zeros(size)
+
+        y = numpy.fft.irfft(acc, 2*size)
+        return (y[:size]+overlap).astype(numpy.float32), y[size:]
+
+    def polyphase(self, samples, phases, starts, indices):
+        samples = numpy.asarray(samples, dtype=numpy.float64)
+        phases = numpy.asarray(phases, dtype=numpy.float64)
+        positions = numpy.asarray(starts)[:,None] + numpy.arange(phases.shape[1])
+        return (samples[positions]*phases[numpy.asarray(indices, dtype=numpy.intp)]).sum(axis=1).astype(numpy.float32)
+
+    def oscillators(self, table, partials, first, n):
+        table = numpy.asarray(table, dtype=numpy.float64)
+        size = len(table)-1
+        slope = numpy.diff(table)
+        k = numpy.arange(first, first+n, dtype=numpy.float64)
+        result = numpy.zeros(n, dtype=numpy.float64)
+        for increment, amplitude, phase in partials:
+            x = (phase + k*increment) % 1.0 * size
+            x = numpy.where(x >= size, x-size, x)
+            j = x.astype(numpy.intp)
+            result += amplitude*(table[j] + (x-j)*slope[j])
+
+        return result.astype(numpy.float32)
+
+    def _stack(self, channels, dtype, axis):
+        n = min(map(len, channels))
+        return numpy.stack([numpy.asarray(c[:n], dtype=dtype) for c in channels], axis=axis)
+
+    def decode_uint8(self, buffer, nChannels):
+        table = numpy.asarray(_UINT8_TABLE, dtype=numpy.float32)
+        return _deinterleave(table[numpy.frombuffer(buffer, dtype=numpy.uint8)], nChannels)
+
+    def decode_int(self, buffer, width, nChannels):
+        if width == 2:
+            data = numpy.frombuffer(buffer, dtype='<i2')
+        elif width == 3:
+            raw = numpy.frombuffer(buffer, dtype=numpy.uint8).reshape(-1, 3)
+            widened = numpy.zeros((len(raw), 4), dtype=numpy.uint8)
+            widened[:,1:] = raw
+            data = widened.view('<i4').reshape(-1)
+            width = 4
+        elif width == 4:
+            data = numpy.frombuffer(buffer, dtype='<i4')
+        else:
+            raise TypeError("Unsupported sample size: {} bytes".format(width))
+
+        scale = 1.0/_amplitude(width)
+        return _deinterleave((data*scale).astype(numpy.float32), nChannels)
+
+    def decode_float32(self, buffer, nChannels):
+        # `astype` copies the data so blocks never hold a reference to the buffer
+        return _deinterleave(numpy.frombuffer(buffer, dtype='<f4').astype(numpy.float32), nChannels)
+
+    def _encode(self, channels, amp, offset, mn, mx, dtype):
+        values = constants(channels)
+        if values is not None:
+            # Encode one frame, then repeat it
+            frame = numpy.clip(numpy.array(values, dtype=numpy.float32).astype(numpy.float64)*amp+offset, mn, mx).astype(dtype)
+            return numpy.tile(frame, min(map(len, channels)))
+
+        data = self._stack(channels, numpy.float64, axis=1)*amp+offset
+        return numpy.clip(data, mn, mx).astype(dtype).reshape(-1)
+
+    def encode_uint8(self, channels):
+        return self._encode(channels, 128.0, 128.0, 0, 255, numpy.uint8).tobytes()
+
+    def encode_int(self, channels, width):
+        amp = float(_amplitude(width))
+        data = self._encode(channels, amp, 0.0, -amp, amp-1, '<i2' if width == 2 else '<i4')
+
+        if width == 3:
+            return data.view(numpy.uint8).reshape(-1, 4)[:,:3].tobytes()
+
+        return data.tobytes()
+
+    def encode_float32(self, channels):
+        return self._stack(channels, '<f4', axis=1).tobytes()
+
+BACKENDS = {
+    PYTHON: PythonBackend(),
+}
+
+if numpy is not None:
+    BACKENDS[NUMPY] = NumpyBackend()
+
+_current = BACKENDS[PYTHON]
+
+def use(name):
+    """ Select the backend used for subsequent sample processing.
+
+        Fall back to the pure Python backend if the requested one is
+        not available. Return the name of the selected backend.
+    """
+    global _current
+    _current = BACKENDS.get(name, BACKENDS[PYTHON])
+
+    return _current.name
+
+def current():
+    """ Return the active backend
+    """
+    return _current
+
+use(os.environ.get("MYSOUND_BACKEND", PYTHON))
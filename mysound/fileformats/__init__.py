@@ -1,66 +1,274 @@
+import hashlib
 import importlib
+import multiprocessing
+import os
+import threading
+import weakref
 
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from mysound import fingerprint
+from mysound import length
 from mysound.context import Context
-from mysound.multichannel import mux, demux
-from mysound.actions import caching
+from mysound.multichannel import mux, demux, eof
+from mysound.actions import caching, skip
 
-def fromFile(cls, *args):
+def fromFile(cls, *args, maxlag=None, **kwargs):
     try:
-        wav = cls(*args)
+        wav = cls(*args, **kwargs)
     except:
         wav.close()
         raise
 
-    return Context(srate=wav.srate), demux(wav.nchannels, blockReader(wav))
+    source = blockReader(wav)
+    if args and isinstance(args[0], str):
+        stat = os.stat(args[0])
+        fingerprint.tag(source, 'file', cls.__module__, os.path.abspath(args[0]), stat.st_mtime_ns, stat.st_size)
+
+    return Context(srate=wav.srate), demux(wav.nchannels, source, maxlag=maxlag)
+
+def loadFile(cls, *args, **kwargs):
+    """ Decode a whole file in one pass.
+
+        Return a context and a list of channels serving zero-copy
+        slices of the decoded samples.
+    """
+    with cls(*args, **kwargs) as wav:
+        ctx = Context(srate=wav.srate)
+        data = wav.read(wav.nDataSamples) or [[] for _ in range(wav.nchannels)]
+
+    if args and isinstance(args[0], str):
+        stat = os.stat(args[0])
+        key = ('load', cls.__module__, os.path.abspath(args[0]), stat.st_mtime_ns, stat.st_size)
+    elif args and isinstance(args[0], (bytes, bytearray, memoryview)):
+        key = ('load', cls.__module__, hashlib.sha256(args[0]).hexdigest())
+    else:
+        key = (None,)
+
+    return ctx, [fingerprint.tag(_samples(channel), *key, n) for n, channel in enumerate(data)]
+
+def _samples(data):
+    """ Return a channel serving zero-copy, read-only, slices of _data_.
+        The slices share the same buffer, so consumers must not be able
+        to modify it.
+    """
+    if isinstance(data, array):
+        view = memoryview(data).toreadonly()
+    elif hasattr(data, 'flags'):
+        # NumPy array
+        view = data.view()
+        view.flags.writeable = False
+    else:
+        view = data
+
+    def at(offset):
+        def read(count):
+            stop = offset+count
+            return view[offset:stop], at(min(stop, len(view)))
+
+        read.skip = lambda n : at(min(offset+n, len(view)))
+        return length.tag(read, len(view)-offset)
+
+    return at(0)
+
+def blockReader(wav, offset=0):
+    """ Return a multichannel source reading blocks from _wav_.
 
-def blockReader(wav):
+        If the reader supports random access (through a `seek` method),
+        each block is read from its own offset, and the returned
+        source exposes a `skip(n)` method that seeks past the next
+        _n_ samples without decoding them.
+
+        The reader is closed once neither the returned source nor any
+        source derived from it (continuations and skipped sources) is
+        referenced anymore.
+    """
+    return _blockReader(_Handle(wav), offset)
+
+class _Handle:
+    """ Keep a reader open as long as a block reader uses it, and serialize
+        the reads from different threads (each read seeks first)
+    """
+    __slots__ = ('wav', 'lock', '__weakref__')
+
+    def __init__(self, wav):
+        self.wav = wav
+        self.lock = threading.Lock()
+        weakref.finalize(self, wav.close)
+
+def _blockReader(handle, offset):
+    wav = handle.wav
     data = None
     cont = None
     loaded = False
-    eof = lambda : (None, eof)
+    seekable = hasattr(wav, 'seek')
 
     def read(count = 4096):
         nonlocal data, cont, loaded
 
         if not loaded:
-            data = wav.read(count)
-            cont = blockReader(wav)
+            with handle.lock:
+                if seekable:
+                    wav.seek(offset)
+                data = wav.read(count)
+            cont = _blockReader(handle, offset+len(data[0]) if data else offset)
             loaded = True
-            if not data:
-                wav.close()
 
         if not data:
             return eof()
 
         return data, cont
 
-    return read
+    if seekable:
+        read.skip = lambda n : _blockReader(handle, offset+n)
+
+    total = getattr(wav, 'dataLength', None)
+    return length.tag(read, None if total is None else total-offset)
+
+BLOCK_SIZE = 10*1024
+SEGMENT_SIZE = 64*BLOCK_SIZE
+
+def toFile(cls, ctx, src, *args, workers=None, segment=SEGMENT_SIZE, progress=None, **kwargs):
+    """ Write the channels of _src_ to a file.
+
+        If _workers_ is greater than 1, the output timeline is split into
+        segments of _segment_ samples rendered in parallel by a pool of
+        worker processes. The result is the same as with serial rendering.
+        Each worker skips to the start of its segment, so this requires all
+        channels to be idempotent (that is, to have a fingerprint, see
+        `mysound.fingerprint`) and to skip samples without reading them
+        (that is, to have a `skip` method, like file sources, generators,
+        and element-wise processors over such sources), as well as the
+        `fork` start method: otherwise, rendering silently falls back to the
+        serial mode.
+
+        If the length of the output is known from the length hints of the
+        channels (see `mysound.length`), the output file is preallocated
+        when the writer supports it. If _progress_ is given, it is called
+        after each block written with the number of samples written so far
+        and the expected total (or `None` if unknown).
 
-def toFile(cls, ctx, src, *args):
-    with cls(ctx.srate, 32, len(src), *args) as dst:
-        src = mux(*src)
+        Other keyword arguments are passed to the writer.
+    """
+    total = length.shortest(src)
+    if total == length.INFINITE:
+        total = None
+
+    report = (lambda done : progress(done, total)) if progress is not None else None
+
+    with cls(ctx.srate, 32, len(src), *args, **kwargs) as dst:
+        if total is not None and hasattr(dst, 'preallocate'):
+            dst.preallocate(total)
+
+        if workers and workers > 1 and _parallelizable(src):
+            _parallelRender(dst, ctx, src, workers, segment, report)
+            return
+
+        done = 0
+        src = mux(*src, fill=True)
         while True:
-            data, src = src(10*1024)
+            data, src = src(BLOCK_SIZE)
             if not data:
                 break
 
             dst.write(data)
+            if report is not None:
+                done += len(data[0])
+                report(done)
+
+def _parallelizable(src):
+    return all(fingerprint.of(channel) is not None and hasattr(channel, 'skip') for channel in src) \
+        and 'fork' in multiprocessing.get_all_start_methods()
+
+# The graph rendered by a worker process. Workers are forked, so the
+# graph is inherited rather than pickled.
+_worker = None
+
+def _initWorker(ctx, src, encoder):
+    global _worker
+    _worker = (ctx, src, encoder)
+
+def _renderSegment(start, count):
+    """ Render and encode _count_ samples starting at _start_.
+        Return the encoded data and the number of samples rendered.
+    """
+    ctx, src, encoder = _worker
+    src = skip(ctx, start, mux(*src, fill=True))
+
+    chunks = []
+    length = 0
+    while length < count:
+        data, src = src(min(BLOCK_SIZE, count-length))
+        if not data:
+            break
+
+        chunks.append(encoder(data))
+        length += len(data[0])
+
+    return b''.join(chunks), length
+
+def _parallelRender(dst, ctx, src, workers, segment, report=None):
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_initWorker, initargs=(ctx, src, dst.encoder)) as pool:
+        pending = deque()
+        start = 0
+        done = 0
+        while True:
+            while len(pending) < 2*workers:
+                pending.append(pool.submit(_renderSegment, start, segment))
+                start += segment
+
+            data, count = pending.popleft().result()
+            dst.write_encoded(data)
+            if report is not None:
+                done += count
+                report(done)
+
+            if count < segment:
+                break
+
+        for future in pending:
+            future.cancel()
 
 READER = {}
 WRITER = {}
+LOADER = {}
 for fmt in ("wave","dummy"):
     module = importlib.import_module("mysound.fileformats.{}".format(fmt))
     try:
         reader = getattr(module, 'Reader', None)
         writer = getattr(module, 'Writer', None)
+        streamWriter = getattr(module, 'StreamWriter', None)
 
         if reader:
-            READER[fmt.upper()] = (lambda reader : lambda *args : fromFile(reader, *args))(reader)
+            READER[fmt.upper()] = (lambda reader : lambda *args, **kwargs : fromFile(reader, *args, **kwargs))(reader)
+        if hasattr(reader, 'nDataSamples'):
+            LOADER[fmt.upper()] = (lambda reader : lambda *args, **kwargs : loadFile(reader, *args, **kwargs))(reader)
         if writer:
-            WRITER[fmt.upper()] = (lambda writer : lambda ctx, src, *args : toFile(writer, ctx, src, *args))(writer)
+            WRITER[fmt.upper()] = (lambda writer : lambda ctx, src, *args, **kwargs : toFile(writer, ctx, src, *args, **kwargs))(writer)
+        if streamWriter:
+            WRITER[fmt.upper()+"_STREAM"] = (lambda writer : lambda ctx, src, *args, **kwargs : toFile(writer, ctx, src, *args, **kwargs))(streamWriter)
     finally:
         del module
 
 WAVE_FILE="WAVE"
-def source(*args, format=WAVE_FILE):
-    return READER[format](*args)
+def source(*args, format=WAVE_FILE, **kwargs):
+    """ Read a file. Return a context and the list of its channels.
+
+        If _maxlag_ is given, the channels share a bounded buffer, so a
+        channel can't read more than _maxlag_ samples ahead of the others
+        (see `multichannel.demux`). Other keyword arguments are passed to
+        the reader.
+    """
+    return READER[format](*args, **kwargs)
+
+def load(*args, format=WAVE_FILE, **kwargs):
+    """ Decode a whole file--or a bytes-like object holding the content of
+        a file--at once. This is faster than `source` for short sounds.
+
+        Only the formats whose reader knows the number of samples of the
+        file up front (through its `nDataSamples` attribute) can be loaded.
+    """
+    return LOADER[format](*args, **kwargs)
@@ -25,6 +25,9 @@ class Reader:
     def nchannels(self):
         return len(self.data)
 
+    def seek(self, offset):
+        self.offset = offset
+
     def read(self, count):
         count = 4
 
@@ -3,14 +3,23 @@
     based on http://www-mmsp.ece.mcgill.ca/Documents/AudioFormats/WAVE/WAVE.html
 """
 
+import io
+import os
 import struct
+import mmap as _mmap
 
 from collections import namedtuple
 from types import SimpleNamespace
-from array import array
+
+from mysound.backend import current, Constant
+
+# Positional reads don't share the file offset, so several readers (or
+# forked processes) can safely read the same file concurrently
+_pread = getattr(os, 'pread', None)
 
 INT8 = 'B'
 INT32 = 'I'
+INT64 = 'Q'
 INT16 = 'H'
 CHAR3 = '3s'
 CHAR4 = '4s'
@@ -25,6 +34,12 @@ WAVE_FORMAT_EXTENSIBLE = 0xFFFE
 STEREO=2
 MONO=1
 
+# Conventional chunk size for streams whose length is not known in advance.
+# This is also the value of the 32 bits sizes superseded by the ds64 chunk
+# in RF64 files
+UNKNOWN_SIZE = 0xFFFFFFFF
+MAX_CHUNK_SIZE = UNKNOWN_SIZE-1
+
 CHUNKS = {
   b"RIFF": (
     ( 'ckSize', INT32 ),
@@ -50,6 +65,12 @@ CHUNKS = {
   b"fact": (
     ( 'dwSampleLength', INT32 ),
   ),
+  b"ds64": (
+    ( 'riffSize', INT64 ),
+    ( 'dataSize', INT64 ),
+    ( 'sampleCount', INT64 ),
+    ( 'tableLength', INT32 ),
+  ),
 }
 
 
@@ -61,26 +82,20 @@ READER={ k: lambda f, k=k : NTUPLE[k](*PARSER[k].unpack(f.read(PARSER[k].size)))
 def SWP24(seq):
     return ((int.from_bytes(i, 'little', signed=True) for i in block) for block in seq)
 
-_IEEE_FLOAT32 = struct.Struct("<"+FLOAT32)
+def _trim(buffer, blockAlign):
+    """ Drop any trailing incomplete block from the buffer.
+    """
+    extra = len(buffer) % blockAlign
+    if extra:
+        return memoryview(buffer)[:len(buffer)-extra]
+
+    return buffer
 
-import itertools
 def IEEE_FLOAT32_DECODER(buffer, nChannels):
-    channels = [array('f') for _ in range(nChannels)]
-    channel = itertools.cycle(channels)
-    for n, in _IEEE_FLOAT32.iter_unpack(buffer):
-        next(channel).append(n)
-
-    return channels
+    return current().decode_float32(_trim(buffer, 4*nChannels), nChannels)
 
 def PCM_INT8_DECODER(buffer, nChannels):
-    channels = [array('f') for _ in range(nChannels)]
-    ifb = int.from_bytes
-    for n in range(0, len(buffer), nChannels):
-        for c in channels:
-            c.append((ifb(buffer[n:n+1], 'little')-128)/128)
-            n+=1
-
-    return channels
+    return current().decode_uint8(_trim(buffer, nChannels), nChannels)
 
 #
 # According to http://blog.bjornroche.com/2009/12/int-float-int-its-jungle-out-there.html
@@ -90,15 +105,7 @@ def PCM_INT8_DECODER(buffer, nChannels):
 # A simple `/ 0x8000` (for 16 bits) is the choice made by ALSA I will follow here
 #
 def PCM_SIGNED_INT_DECODER(buffer, bytesperchannel, nChannels):
-    channels = [array('f') for _ in range(nChannels)]
-    amplitude = (1<<bytesperchannel*8-1)
-    ifb = int.from_bytes
-    for n in range(0, len(buffer), nChannels*bytesperchannel):
-        for c in channels:
-            c.append(ifb(buffer[n:n+bytesperchannel], 'little', signed=True)/amplitude)
-            n+=bytesperchannel
-
-    return channels
+    return current().decode_int(_trim(buffer, bytesperchannel*nChannels), bytesperchannel, nChannels)
 
 def PCM_INT8_MONO_DECODER(buffer):
     return PCM_INT8_DECODER(buffer, 1)
@@ -143,15 +150,56 @@ DECODERS={
     (WAVE_FORMAT_IEEE_FLOAT, 8, 32, STEREO): IEEE_FLOAT32_STEREO_DECODER,
 }
 
+class _MemoryStream:
+    """ Minimal read-only stream over a bytes-like object. Unlike `io.BytesIO`,
+        it doesn't copy the underlying buffer.
+    """
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer).cast('B')
+        self.offset = 0
+
+    def read(self, size):
+        start = self.offset
+        self.offset = min(start+size, len(self.buffer))
+        return bytes(self.buffer[start:self.offset])
+
+    def tell(self):
+        return self.offset
+
+    def close(self):
+        pass
+
 class Reader:
-    def __init__(self, path):
-        self.stream = open(path, 'rb')
+    """ A class to read Wav files
+
+        _path_ is either the path of a file, or a bytes-like object holding
+        the content of a Wav file (like an uploaded file body).
+
+        When _mmap_ is true, the file is memory-mapped and samples are decoded
+        straight from the mapped data chunk. Data held in memory are always
+        decoded straight from the given buffer. In all modes, the reader
+        supports random access through `seek`.
+    """
+    # Number of samples per channel, set once the data chunk is found.
+    # Readers exposing it can be decoded at once by `fileformats.load`
+    nDataSamples = None
+
+    def __init__(self, path, *, mmap=False):
+        buffer = None
+        if isinstance(path, (bytes, bytearray, memoryview)):
+            buffer = path
+            self.stream = _MemoryStream(buffer)
+        else:
+            self.stream = open(path, 'rb')
+        self.map = None
+        self.data = None
         self.state = SimpleNamespace()
         self.state.format = None
         self.state.nSamplesPerSec = None
         self.state.nChannels = None
         self.state.wBitsPerSample = None
         self.state.nBlockAlign = None
+        self.state.ds64 = None
 
         self.readWaveHeader(self.stream)
         while True:
@@ -161,7 +209,26 @@ class Reader:
         else:
             raise TypeError("Data chunk not found")
 
+        if buffer is None and mmap:
+            buffer = self.map = _mmap.mmap(self.stream.fileno(), 0, access=_mmap.ACCESS_READ)
+
+        if buffer is not None:
+            buffer = memoryview(buffer).cast('B')
+            self.nDataSamples = self.dataLength = min(self.dataLength, (len(buffer)-self.dataStart)//self.state.nBlockAlign)
+            self.data = buffer[self.dataStart:self.dataStart+self.dataLength*self.state.nBlockAlign]
+            buffer.release()
+        else:
+            # the data chunk may be truncated, or of unknown length
+            size = os.fstat(self.stream.fileno()).st_size
+            self.nDataSamples = self.dataLength = min(self.dataLength, (size-self.dataStart)//self.state.nBlockAlign)
+
     def close(self):
+        if self.data is not None:
+            self.data.release()
+            self.data = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
         self.stream.close()
 
     def __enter__(self):
@@ -184,9 +251,9 @@ class Reader:
 
     def readWaveHeader(self, stream):
         magick = stream.read(4)
-        self.assertTrue(magick == b"RIFF", "{} does not seem to be a valid WAV file", stream)
+        self.assertTrue(magick in (b"RIFF", b"RF64", b"BW64"), "{} does not seem to be a valid WAV file", stream)
 
-        header = READER[magick](stream)
+        header = READER[b"RIFF"](stream)
         if header.WAVEID != b"WAVE":
             raise TypeError("{} does not seem to be a valid WAV file".format(stream))
 
@@ -249,22 +316,59 @@ class Reader:
         chunk40 = READER[b'fmt 40'](stream)
         self.state.format = chunk40.wFormatTag
 
+    def handleds64Chunk(self, stream, ckID, cksize):
+        self.state.ds64 = READER[b'ds64'](stream)
+        self.handleUnknownChunk(stream, ckID, cksize-PARSER[b'ds64'].size)
+
     def handledataChunk(self, stream, ckID, cksize):
+        if cksize == UNKNOWN_SIZE and self.state.ds64 is not None:
+            cksize = self.state.ds64.dataSize
+
         self.decoder = DECODERS[self.state.format, self.state.nBlockAlign, self.state.wBitsPerSample, self.state.nChannels]
-        self.nDataSamples = cksize//self.state.nBlockAlign
+        self.nDataSamples = self.dataLength = cksize//self.state.nBlockAlign
+        self.dataStart = stream.tell()
+        self.position = 0
+
+    def seek(self, offset):
+        """ Move to the _offset_-th sample of the data chunk
+        """
+        offset = max(0, min(offset, self.dataLength))
+        if self.data is None and _pread is None:
+            self.stream.seek(self.dataStart+offset*self.state.nBlockAlign)
+
+        self.position = offset
+        self.nDataSamples = self.dataLength-offset
+
+    def tell(self):
+        """ Return the offset of the next sample to read in the data chunk
+        """
+        return self.position
 
     def read(self, count):
         """ Read count samples from the data chunk
         """
-        nChannels = self.state.nChannels
-        maxBufferSize = 4*self.state.nBlockAlign
+        blockAlign = self.state.nBlockAlign
 
         count = min(count, self.nDataSamples)
         if not count:
             return None
 
-        buffer = self.stream.read(count*self.state.nBlockAlign)
+        start = self.position*blockAlign
+        size = count*blockAlign
+        if self.data is not None:
+            buffer = self.data[start:start+size]
+        elif _pread is not None:
+            buffer = _pread(self.stream.fileno(), size, self.dataStart+start)
+        else:
+            buffer = self.stream.read(size)
 
+        # the data chunk may be truncated, or of unknown length
+        count = len(buffer)//blockAlign
+        if not count:
+            self.nDataSamples = 0
+            return None
+
+        self.position += count
         self.nDataSamples -= count
 
         return self.decoder(buffer)
@@ -272,54 +376,37 @@ class Reader:
     chunkHandlers = {
         b'fmt ': handlefmt_Chunk,
         b'data': handledataChunk,
+        b'ds64': handleds64Chunk,
     }
 
-def clip(mn, v, mx):
-    if v < mn:
-        return mn
-    if v > mx:
-        return mx
-    return v
-
-def IEEE_FLOAT32_ENCODER(stream, samples):
-    _int = int
-    _clip = clip
-
-    for data in itertools.chain(*zip(*samples)):
-        stream.write(_IEEE_FLOAT32.pack(data))
+def IEEE_FLOAT32_ENCODER(samples):
+    return current().encode_float32(samples)
 
-def PCM_INT8_ENCODER(stream, samples):
-    _int = int
-    _clip = clip
-    stream.write(bytes([
-        clip(0,_int(sample*128.0+128.0),255) for sample in itertools.chain(*zip(*samples))
-    ]))
+def PCM_INT8_ENCODER(samples):
+    return current().encode_uint8(samples)
 
-def PCM_SIGNED_INT_ENCODER(stream, samples, bytesperchannel):
-    _int = int
-    _itb = int.to_bytes
-    _clip = clip
-    amp = float(1<<8*bytesperchannel-1)
-    mn = int(-amp)
-    mx = int(amp-1)
+def PCM_SIGNED_INT_ENCODER(samples, bytesperchannel):
+    return current().encode_int(samples, bytesperchannel)
 
-    for data in [ _itb(_clip(mn,_int(sample*amp),mx), bytesperchannel, 'little', signed=True) for sample in itertools.chain(*zip(*samples))]:
-        stream.write(data)
+def PCM_INT16_ENCODER(samples):
+    return PCM_SIGNED_INT_ENCODER(samples, 2)
 
-def PCM_INT16_ENCODER(stream, samples):
-    return PCM_SIGNED_INT_ENCODER(stream, samples, 2)
+def PCM_INT24_ENCODER(samples):
+    return PCM_SIGNED_INT_ENCODER(samples, 3)
 
-def PCM_INT24_ENCODER(stream, samples):
-    return PCM_SIGNED_INT_ENCODER(stream, samples, 3)
-
-def PCM_INT32_ENCODER(stream, samples):
-    return PCM_SIGNED_INT_ENCODER(stream, samples, 4)
+def PCM_INT32_ENCODER(samples):
+    return PCM_SIGNED_INT_ENCODER(samples, 4)
 
 class Writer:
     """ A class to write Wav files
+
+        _path_ is either the path of the file to create or a writable
+        and seekable binary file object. A file object is flushed, but not
+        closed, by `close`.
     """
     def __init__(self, nSamplesPerSec, wBitsPerSample, nChannels, path, *, format=None):
-        self.stream = open(path, 'wb')
+        self.owned = not hasattr(path, 'write')
+        self.stream = open(path, 'wb') if self.owned else path
 
         if format is None:
             format = WAVE_FORMAT_IEEE_FLOAT
@@ -335,16 +422,65 @@ class Writer:
 
 
         self.encoder, *chunks = ENCODERS[format, wBitsPerSample]
+        self.preallocated = False
 
         for chunk in chunks:
             chunk(self)
 
     def close(self):
         self.filelength = self.stream.tell()
-        for pos, f in self.cleanup:
+        if self.preallocated:
+            self.stream.truncate()
+        self.patch()
+        if self.owned:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def preallocate(self, nFrames):
+        """ Reserve the disk space for _nFrames_ samples per channel, if the
+            platform and the output support it. The unused space is released
+            by `close`.
+        """
+        fallocate = getattr(os, 'posix_fallocate', None)
+        if fallocate is None:
+            return
+
+        try:
+            fallocate(self.stream.fileno(), self.data_end, nFrames*self.state.nBlockAlign)
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return
+
+        self.preallocated = True
+
+    def patch(self, promote=True):
+        """ Write the chunk sizes in the header
+
+            If _promote_ is true and a size does not fit in 32 bits, the
+            file is promoted to RF64: the reserved JUNK chunk is replaced
+            by a ds64 chunk holding the 64 bits sizes.
+        """
+        end = self.stream.tell()
+        sizes = [ (pos, f(self)) for pos, f in self.cleanup ]
+        for pos, size in sizes:
             self.stream.seek(pos)
-            self.stream.write(f(self).to_bytes(4, 'little'))
-        self.stream.close()
+            self.stream.write(min(size, UNKNOWN_SIZE).to_bytes(4, 'little'))
+
+        if promote and any(size > MAX_CHUNK_SIZE for pos, size in sizes):
+            dataSize = self.data_end-self.data_start
+            self.stream.seek(0)
+            self.stream.write(b'RF64')
+            self.stream.write(UNKNOWN_SIZE.to_bytes(4, 'little'))
+            self.stream.seek(self.data_start-4)
+            self.stream.write(UNKNOWN_SIZE.to_bytes(4, 'little'))
+            self.stream.seek(self.ds64_start)
+            self.stream.write(b'ds64')
+            self.stream.write(PARSER[b'ds64'].size.to_bytes(4, 'little'))
+            self.stream.write(PARSER[b'ds64'].pack(self.filelength-8,
+                                                   dataSize,
+                                                   dataSize//self.state.nBlockAlign,
+                                                   0))
+        self.stream.seek(end)
 
     def __enter__(self):
         return self
@@ -355,7 +491,12 @@ class Writer:
     def write(self, samples):
         assert len(samples) == self.state.nChannels
 
-        self.encoder(self.stream, samples)
+        self.write_encoded(self.encoder(samples))
+
+    def write_encoded(self, data):
+        """ Write samples already encoded using `self.encoder`
+        """
+        self.stream.write(data)
         self.data_end = self.stream.tell()
 
     def write_header(self):
@@ -367,6 +508,12 @@ class Writer:
         self.stream.write(b'\x00\x00\x00\x00')
         self.stream.write(b'WAVE')
 
+        # Reserve room for a ds64 chunk in case the file grows past 4 GiB
+        self.ds64_start = self.stream.tell()
+        self.stream.write(b'JUNK')
+        self.stream.write(PARSER[b'ds64'].size.to_bytes(4, 'little'))
+        self.stream.write(bytes(PARSER[b'ds64'].size))
+
     def write_fmt16(self):
         self.stream.write(b'fmt ')
 
@@ -403,9 +550,21 @@ class Writer:
         self.stream.write(b'fact')
         self.stream.write((4).to_bytes(4, 'little'))
 
-        self.cleanup.append((self.stream.tell(), lambda self : (self.data_end-self.data_start)//(self.state.nChannels*self.state.nBlockAlign)))
+        self.cleanup.append((self.stream.tell(), Writer.fact_size))
         self.stream.write(b'\x00\x00\x00\x00')
 
+    def fact_size(self):
+        """ Return the number of samples per channel stored in the fact
+            chunk. When the data chunk size doesn't fit in 32 bits (RF64
+            files, or unknown lengths), it is held by the ds64 chunk and
+            the fact chunk uses the "unknown" value.
+        """
+        dataSize = self.data_end-self.data_start
+        if dataSize > MAX_CHUNK_SIZE:
+            return UNKNOWN_SIZE
+
+        return dataSize//self.state.nBlockAlign
+
     def write_data(self):
         self.stream.write(b'data')
 
@@ -422,3 +581,67 @@ ENCODERS ={
     (WAVE_FORMAT_IEEE_FLOAT, 32): (IEEE_FLOAT32_ENCODER, Writer.write_header, Writer.write_fmt40, Writer.write_fact, Writer.write_data),
 }
 
+class StreamWriter:
+    """ A class to write Wav files to non-seekable outputs (pipes, sockets,
+        standard output, ...)
+
+        The header is written up front. If _nFrames_ is given, it holds the
+        final sizes, and the output is truncated or padded with silence to
+        exactly _nFrames_ samples per channel. Otherwise, it uses the
+        conventional "unknown length" sizes.
+
+        The output stream is flushed, but not closed, by `close`.
+    """
+    def __init__(self, nSamplesPerSec, wBitsPerSample, nChannels, stream, *, format=None, nFrames=None):
+        if format is None:
+            format = WAVE_FORMAT_IEEE_FLOAT
+
+        self.stream = stream
+        self.nFrames = nFrames
+        self.written = 0
+        self.nChannels = nChannels
+        self.nBlockAlign = nChannels*wBitsPerSample//8
+        self.encoder = ENCODERS[format, wBitsPerSample][0]
+
+        self.stream.write(header(nSamplesPerSec, wBitsPerSample, nChannels, format=format, nFrames=nFrames))
+
+    def close(self):
+        if self.nFrames is not None and self.written < self.nFrames:
+            self.write([Constant(0.0, self.nFrames-self.written)]*self.nChannels)
+
+        self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, samples):
+        assert len(samples) == self.nChannels
+
+        self.write_encoded(self.encoder(samples))
+
+    def write_encoded(self, data):
+        """ Write samples already encoded using `self.encoder`
+        """
+        if self.nFrames is not None:
+            data = data[:(self.nFrames-self.written)*self.nBlockAlign]
+
+        self.stream.write(data)
+        self.written += len(data)//self.nBlockAlign
+
+def header(nSamplesPerSec, wBitsPerSample, nChannels, *, format=None, nFrames=None):
+    """ Return the header of a Wav file holding _nFrames_ samples per channel,
+        as written by `Writer`. If _nFrames_ is `None`, the chunk sizes are
+        set to the conventional "unknown length" value.
+    """
+    buffer = io.BytesIO()
+    writer = Writer(nSamplesPerSec, wBitsPerSample, nChannels, buffer, format=format)
+
+    size = UNKNOWN_SIZE if nFrames is None else nFrames*writer.state.nBlockAlign
+    writer.data_end = writer.data_start+size
+    writer.filelength = writer.data_end
+    writer.patch(promote=nFrames is not None)
+
+    return buffer.getvalue()
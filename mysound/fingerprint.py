@@ -0,0 +1,127 @@
+""" Structural fingerprints of sources
+
+    Generators, processors and actions tag the source they return with
+    a `fingerprint` attribute computed from their name, their parameters
+    and the fingerprints of their input channels. Two sources with the same
+    fingerprint produce the same samples, so the fingerprint can be used
+    as a key to cache rendered data (see `mysound.rendercache`).
+
+    Sources that are not idempotent (like `generator.call`), or built
+    from such sources, have no fingerprint.
+"""
+
+import hashlib
+import types
+
+def of(source):
+    """ Return the fingerprint of a source, or `None` if it has none
+    """
+    return getattr(source, 'fingerprint', None)
+
+def function(fct):
+    """ Return a stable key identifying a function and its behavior, or `None`
+        if it can't be identified reliably.
+
+        The key of a Python function is computed from its bytecode, its
+        constants, its default values, and the values it captures (closure
+        cells and the globals it references), so changing the body of a
+        function changes its key. Captured values must be immutable (numbers,
+        strings, tuples, ...), modules, classes or functions: otherwise the
+        function has no key. Builtin functions are identified by their name.
+    """
+    module = getattr(fct, '__module__', None)
+    name = getattr(fct, '__qualname__', None)
+    if module is None or name is None:
+        return None
+
+    try:
+        key = _describe(fct, frozenset())
+    except (TypeError, ValueError):
+        return None
+
+    return "{}.{}#{}".format(module, name, hashlib.sha256(key.encode()).hexdigest())
+
+_SCALARS = (type(None), bool, int, float, complex, str, bytes)
+
+def _describe(value, seen):
+    """ Return a description of _value_ that only changes when it behaves
+        differently. Raise TypeError if there is none.
+
+        _seen_ holds the ids of the functions being described, to stop
+        at recursive references.
+    """
+    if type(value) in _SCALARS:
+        return repr(value)
+    if type(value) is tuple:
+        return "({})".format(", ".join(_describe(item, seen) for item in value))
+    if type(value) is frozenset:
+        return "frozenset({})".format(", ".join(sorted(_describe(item, seen) for item in value)))
+    if isinstance(value, types.ModuleType):
+        return "module {}".format(value.__name__)
+    if isinstance(value, type):
+        return "class {}.{}".format(value.__module__, value.__qualname__)
+    if isinstance(value, types.CodeType):
+        return _code(value, seen)
+    if isinstance(value, types.FunctionType):
+        return _function(value, seen)
+    if isinstance(value, types.MethodType):
+        return "method {} of {}".format(_function(value.__func__, seen), _describe(value.__self__, seen))
+    if isinstance(value, types.BuiltinFunctionType):
+        owner = value.__self__
+        if owner is None or isinstance(owner, types.ModuleType):
+            return "builtin {}.{}".format(value.__module__, value.__qualname__)
+        return "builtin {} of {}".format(value.__qualname__, _describe(owner, seen))
+
+    raise TypeError("Can't describe a {} value".format(type(value).__name__))
+
+def _code(code, seen):
+    return repr((code.co_code, code.co_names, tuple(_describe(const, seen) for const in code.co_consts)))
+
+def _names(code):
+    """ Return the global names that may be referenced by _code_ and the
+        functions defined in its body
+    """
+    result = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            result |= _names(const)
+
+    return result
+
+def _function(fct, seen):
+    if id(fct) in seen:
+        return "recursive {}.{}".format(fct.__module__, fct.__qualname__)
+    seen = seen | { id(fct) }
+
+    namespace = fct.__globals__
+    references = sorted(name for name in _names(fct.__code__) if name in namespace)
+
+    return repr((
+        fct.__module__,
+        fct.__qualname__,
+        _code(fct.__code__, seen),
+        _describe(fct.__defaults__ or (), seen),
+        _describe(tuple(sorted((fct.__kwdefaults__ or {}).items())), seen),
+        tuple(_describe(cell.cell_contents, seen) for cell in fct.__closure__ or ()),
+        tuple((name, _describe(namespace[name], seen)) for name in references),
+    ))
+
+def compute(name, *args, sources=()):
+    """ Return the fingerprint of a source built by _name_ from
+        the parameters _args_ and the input channels _sources_.
+    """
+    fingerprints = [of(source) for source in sources]
+    if None in fingerprints or None in args:
+        return None
+
+    key = repr((name, args, fingerprints))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def tag(source, name, *args, sources=()):
+    """ Attach a fingerprint to _source_ if it can be computed. Return _source_
+    """
+    fingerprint = compute(name, *args, sources=sources)
+    if fingerprint is not None:
+        source.fingerprint = fingerprint
+
+    return source
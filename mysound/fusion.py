@@ -0,0 +1,168 @@
+""" Pipeline fusion
+
+    When interpreted, each stage of a graph like
+    `mean(apply(f, a, b), c)` reads its inputs through its own
+    multiplexer and creates new continuations for every chunk, and
+    a source used by several stages is read once per stage. `compile`
+    walks the graph behind a source (see `mysound.graph`) and fuses the
+    nested element-wise stages (`apply` and `mean`) into a single kernel,
+    generated once, that reads all the inputs through one multiplexer and
+    evaluates the stages block by block. This pays off most with small
+    blocks, where the per-stage multiplexers and continuations dominate
+    the cost of the interpreted path.
+
+    Like in the interpreted path, each stage stores its result in a single
+    precision array, so the compiled source produces exactly the same
+    samples.
+"""
+
+import itertools
+import math
+import operator
+
+from array import array
+
+from mysound import fingerprint
+from mysound import graph
+from mysound import length
+from mysound.backend import current, Constant, PYTHON
+from mysound.multichannel import mux
+from mysound.actions import pick
+from mysound.processor import eof
+
+# Stages computing each output sample from the input samples at the same position
+ELEMENTWISE = ('apply', 'mean')
+
+def compile(source):
+    """ Return a source producing the same samples as _source_, with its
+        element-wise stages fused.
+
+        The graph is walked through `mux`, `pick`, `apply` and `mean`.
+        Other sources (generators, file sources, other processors, ...) are
+        read as they are.
+
+        The NumPy backend already processes whole blocks using vectorized
+        primitives, so with that backend, _source_ is returned unchanged.
+    """
+    if current().name != PYTHON:
+        return source
+
+    return _compile(source)
+
+def _compile(source):
+    node = graph.of(source)
+    if node is None:
+        return source
+
+    kind, params, sources = node
+    if kind == 'mux':
+        fill, = params
+        return mux(*[_compile(s) for s in sources], fill=fill)
+    if kind == 'pick':
+        n, = params
+        return pick(n, *[_compile(s) for s in sources])
+    if kind in ELEMENTWISE:
+        return _fuse(source)
+
+    return source
+
+def _kernel(source):
+    """ Generate the kernel computing the element-wise stages rooted
+        at _source_.
+
+        The kernel takes the length of a block, and one block of samples
+        for each source it reads, and evaluates each stage over the whole
+        block at once. Like in the interpreted path, a stage whose inputs
+        are all constant over the block is computed once for the whole
+        block. An idempotent source (or stage) used several times in the
+        graph is read (or computed) only once.
+
+        Return the kernel and the list of the sources read by it.
+    """
+    leaves = []
+    lines = []
+    names = {}
+    stages = itertools.count()
+    namespace = {
+        'array': array, 'fsum': math.fsum, 'add': operator.add, 'mul': operator.mul,
+        'repeat': itertools.repeat, 'C': Constant,
+    }
+
+    def visit(source):
+        """ Emit the code computing _source_, return the name of its result
+        """
+        name = names.get(id(source))
+        if name is not None:
+            return name
+
+        node = graph.of(source)
+        kind = node[0] if node is not None else None
+        if kind not in ELEMENTWISE:
+            leaves.append(_compile(source))
+            name = "x{}".format(len(leaves)-1)
+        else:
+            kind, params, sources = node
+            args = [visit(s) for s in sources]
+            name = "t{}".format(next(stages))
+            values = "({},)".format(", ".join(arg+".value" for arg in args))
+            if kind == 'apply':
+                fct = "f{}".format(len(namespace))
+                namespace[fct] = params[0]
+                constant = "{}({})".format(fct, values)
+                block = "array('f', map({}, zip({})))".format(fct, ", ".join(args))
+            elif len(args) == 2:
+                # The sum of two numbers is correctly rounded, like their fsum,
+                # and halving is exact, so this is fsum(v)/2 without a
+                # Python loop
+                constant = "fsum({})/2".format(values)
+                block = "array('f', map(mul, map(add, {}), repeat(0.5)))".format(", ".join(args))
+            else:
+                constant = "fsum({})/{}".format(values, len(args))
+                block = "array('f', [fsum(v)/{} for v in zip({})])".format(len(args), ", ".join(args))
+
+            lines.extend((
+                "if {}:".format(" and ".join("type({}) is C".format(arg) for arg in args)),
+                "    {} = C({}, n)".format(name, constant),
+                "else:",
+                "    {} = {}".format(name, block),
+            ))
+
+        if fingerprint.of(source) is not None:
+            # keep the source alive, so its id can't be reused
+            names[id(source)] = name
+            namespace["_"+name] = source
+
+        return name
+
+    result = visit(source)
+    code = "\n".join((
+        "def kernel(n, {}):".format(", ".join("x{}".format(i) for i in range(len(leaves)))),
+        *("    "+line for line in lines),
+        "    return {}".format(result),
+    ))
+    exec(code, namespace)
+
+    return namespace['kernel'], leaves
+
+def _fuse(source):
+    kernel, leaves = _kernel(source)
+
+    def _fused(src):
+        def read(n):
+            chunk, cont = src(n)
+            if not chunk:
+                return eof()
+
+            return kernel(len(chunk[0]), *chunk), _fused(cont)
+
+        if hasattr(src, 'skip'):
+            read.skip = lambda n : _fused(src.skip(n))
+
+        return length.tag(read, length.of(src))
+
+    result = _fused(mux(*leaves, fill=True))
+    key = fingerprint.of(source)
+    if key is not None:
+        result.fingerprint = key
+
+    return result
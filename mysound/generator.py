@@ -8,8 +8,11 @@
    This is the basic way of processing sounds with `mysound`
 """
 
-from array import array
+import math
 
+from mysound import fingerprint
+from mysound import length
+from mysound.backend import current, Constant
 from mysound.time import to_samples, seconds
 
 MIN = -1.0
@@ -19,11 +22,13 @@ ZERO = 0.0
 def y(context, f):
     r = lambda *args : (f(*args), y(context, f))
     r.context = context
+    r.length = length.INFINITE
+    r.skip = lambda n : r
 
     return r
 
 def samples(values=()):
-    return array('f', values)
+    return current().samples(values)
 
 def sample(*values):
     return samples(values)
@@ -38,9 +43,10 @@ def rawdata(data):
             stop = offset+count
             return samples(data[offset:stop]), at(stop)
 
-        return read
+        read.skip = lambda n : at(offset+n)
+        return length.tag(read, len(data)-offset)
 
-    return at(0)
+    return fingerprint.tag(at(0), 'rawdata', tuple(data))
 
 def call(fct):
     """ Return a generator whose values are obtained by
@@ -57,7 +63,7 @@ def call(fct):
     def read(n):
         return samples([fct() for _ in range(n)]), read
 
-    return read
+    return length.tag(read, length.INFINITE)
 
 def silence(context):
     """ Return a generator producing an infinite amount of silence
@@ -66,14 +72,15 @@ def silence(context):
 
 def constant(context, v):
     """ Return a generator producing an infinite stream of samples
-        with the same value
-    """
-    buffer = sample(v)*1000
+        with the same value.
 
+        The chunks are `Constant` instances, so downstream processors
+        can handle them without computing each sample.
+    """
     def generator(n):
-        return buffer[:n]
+        return Constant(v, n)
 
-    return y(context, generator)
+    return fingerprint.tag(y(context, generator), 'constant', float(v))
 
 def ramp(ctx, duration=seconds(1), start=MIN, stop=MAX):
     """ Return a genertor that walks up through the [from, to] range
@@ -88,16 +95,73 @@ def ramp(ctx, duration=seconds(1), start=MIN, stop=MAX):
 
     def y(start, amplitude, acc, count):
         def generator(n):
-            n = min(n, count-acc)
-            r = sample(0)*n
+            n = max(0, min(n, count-acc))
+            r = current().ramp(start, amplitude, acc, n, count)
+
+            return r, y(start, amplitude, acc+n, count)
+
+        generator.skip = lambda n : y(start, amplitude, min(acc+n, count), count)
+        return length.tag(generator, count-acc)
+
+    return fingerprint.tag(y(float(start), amplitude, 0, count), 'ramp', count, float(start), amplitude)
+
+#
+# Wavetables hold one period of a waveform, plus a guard sample (equal to
+# the first one) so interpolation never has to wrap around.
+#
+TABLE_SIZE = 4096
+
+def _table(f):
+    table = tuple(f(k/TABLE_SIZE) for k in range(TABLE_SIZE))
+    return table + table[:1]
+
+WAVEFORMS = {
+    'sine': _table(lambda t : math.sin(2*math.pi*t)),
+    'square': _table(lambda t : 1.0 if t < 0.5 else -1.0),
+    'saw': _table(lambda t : 2*t if t < 0.5 else 2*t-2),
+    'triangle': _table(lambda t : 4*t if t < 0.25 else 2-4*t if t < 0.75 else 4*t-4),
+}
+
+def bank(ctx, partials, waveform='sine'):
+    """ Return a generator producing the sum of several oscillators
+        sharing the same waveform. _partials_ is a sequence of
+        (frequency, amplitude) or (frequency, amplitude, phase) tuples,
+        frequencies being expressed in Hz and phases in periods.
+
+        The phase is accumulated from sample to sample, but restarted from
+        its exact value, computed from the sample index, at fixed positions.
+        So the output doesn't depend on the chunk sizes, and rounding
+        errors can't build up.
+    """
+    table = WAVEFORMS[waveform]
+    partials = tuple(
+        (float(frequency)/ctx.srate, float(amplitude), float(phase))
+            for frequency, amplitude, phase in ((*p, 0.0)[:3] for p in partials)
+    )
+
+    def at(first):
+        def read(n):
+            return current().oscillators(table, partials, first, n), at(first+n)
+
+        read.skip = lambda n : at(first+n)
+        return length.tag(read, length.INFINITE)
+
+    return fingerprint.tag(at(0), 'bank', waveform, partials)
+
+def oscillator(ctx, waveform, frequency, amplitude=MAX, phase=0.0):
+    """ Return a generator producing a periodic signal of the given
+        _waveform_ (one of the `WAVEFORMS` keys) and _frequency_ (in Hz)
+    """
+    return bank(ctx, ((frequency, amplitude, phase),), waveform)
 
-            i = 0
-            while i < n:
-                r[i] = start + (acc+i)/(count-1)*amplitude
-                i += 1
+def sine(ctx, frequency, amplitude=MAX, phase=0.0):
+    return oscillator(ctx, 'sine', frequency, amplitude, phase)
 
-            return r, y(start, amplitude, acc+i, count)
+def square(ctx, frequency, amplitude=MAX, phase=0.0):
+    return oscillator(ctx, 'square', frequency, amplitude, phase)
 
-        return generator
+def saw(ctx, frequency, amplitude=MAX, phase=0.0):
+    return oscillator(ctx, 'saw', frequency, amplitude, phase)
 
-    return y(float(start), amplitude, 0, count)
+def triangle(ctx, frequency, amplitude=MAX, phase=0.0):
+    return oscillator(ctx, 'triangle', frequency, amplitude, phase)
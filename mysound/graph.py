@@ -0,0 +1,21 @@
+""" Structure of source graphs
+
+    Some sources (`mux`, `pick`, `apply` and `mean`) describe how they were
+    built in a `node` attribute holding their kind, their parameters and
+    their input channels. This lets tools like `mysound.fusion` walk the
+    graph behind a source. Other sources have no node, and are seen as
+    opaque leaves.
+"""
+
+def of(source):
+    """ Return the node of a source as a (kind, params, sources) tuple,
+        or `None` if it has none
+    """
+    return getattr(source, 'node', None)
+
+def tag(source, kind, *params, sources=()):
+    """ Attach a node to _source_. Return _source_
+    """
+    source.node = (kind, params, tuple(sources))
+
+    return source
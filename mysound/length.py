@@ -0,0 +1,39 @@
+""" Length hints of sources
+
+    Sources that know how many samples they will still produce expose that
+    number as their `length` attribute: file sources know it from the file
+    header, generators from their parameters, and processors compute it
+    from the hints of their input channels. Endless sources (like
+    `generator.silence`) have an `INFINITE` length.
+
+    Hints are used to preallocate buffers (see `processor.materialize`),
+    output files, and to report progress (see `mysound.sink`). Sources
+    whose length can't be known have no hint.
+"""
+
+import math
+
+INFINITE = math.inf
+
+def of(source):
+    """ Return the length hint of a source, or `None` if it has none
+    """
+    return getattr(source, 'length', None)
+
+def shortest(sources):
+    """ Return the length hint of a source stopping with the shortest of
+        _sources_, or `None` if one of them has no hint
+    """
+    lengths = [of(source) for source in sources]
+    if not lengths or None in lengths:
+        return None
+
+    return min(lengths)
+
+def tag(source, length):
+    """ Attach a length hint to _source_ if it is known. Return _source_
+    """
+    if length is not None:
+        source.length = max(length, 0)
+
+    return source
@@ -2,23 +2,66 @@
     multichannel source and destinations
 """
 
+from collections import deque
+from types import SimpleNamespace
+
 import mysound.generator as generator
 
+from mysound import fingerprint
+from mysound import graph
+from mysound import length
+
+from mysound.backend import current
+
 def eof(*args):
     """ Infinite generator of the `None` constant. 
         Returned when a multichannels source is exhausted;
     """
     return None, eof
 
-def mux(*generators):
+def _gather(offset, data, gen, count):
+    """ Read up to _count_ samples from a channel, starting at _offset_ in
+        its current segment of _data_, and continuing across the segment
+        boundaries.
+
+        Return the gathered samples and the continuation of the source.
+    """
+    pieces = []
+    length = 0
+    if offset < len(data):
+        pieces.append(data[offset:])
+        length = len(data)-offset
+
+    while length < count:
+        block, gen = gen(count-length)
+        if not len(block):
+            break
+
+        pieces.append(block)
+        length += len(block)
+
+    if len(pieces) == 1:
+        return pieces[0], gen
+
+    return current().concat(pieces), gen
+
+def mux(*generators, fill=False):
     """ Multiplex several sources to produce a multichannel source.
 
         When called, the multichannel source return either a n-m
         matrix of samples containing the next chunk of samples _or_
         `None` if at least one stream is exhausted.
+
+        By default, each read is truncated to the shortest segment
+        available among the input channels. If _fill_ is true, data are
+        gathered across the segment boundaries so a read returns the
+        requested number of samples unless a channel reaches its end.
     """
     def _mux(gb):
         def read(count):
+            if fill:
+                return _fill(count)
+
             # Force loading of the first data segement. This should be idempotent.
             nonlocal gb
             gb = [ (offset,data,gen) if offset < len(data) else ( 0, *gen(count) ) for offset, data, gen in gb ]
@@ -39,14 +82,59 @@ def mux(*generators):
                 (offset+count, data, gen) for offset, data, gen in gb
             ])
 
+        def _fill(count):
+            gathered = [ _gather(offset, data, gen, count) for offset, data, gen in gb ]
+
+            count = min(len(data) for data, gen in gathered)
+            if count == 0:
+                # At least one stream exhausted
+                return eof()
+
+            data = [ data[:count] for data, gen in gathered ]
+            return data, _mux([
+                (count, data, gen) for data, gen in gathered
+            ])
+
+        if all(hasattr(gen, 'skip') for offset, data, gen in gb):
+            read.skip = lambda n : _mux([
+                (offset+n, data, gen) if offset+n < len(data) else (0, [], gen.skip(offset+n-len(data)))
+                    for offset, data, gen in gb
+            ])
+
+        remaining = [length.of(gen) for offset, data, gen in gb]
+        if None not in remaining:
+            length.tag(read, min(n+len(data)-offset for n, (offset, data, gen) in zip(remaining, gb)))
+
         return read
 
-    return _mux([(0, [], generator) for generator in generators])
+    result = fingerprint.tag(_mux([(0, [], generator) for generator in generators]), 'mux', sources=generators)
+    return graph.tag(result, 'mux', fill, sources=generators)
+
+# Size in bytes of a sample, used to report the memory used by buffers
+SAMPLE_SIZE = 4
 
-def demux(count, source):
+def demux(count, source, maxlag=None):
     """ Demux a multi-channel source.
     
         Return a list of _count_ individual channels.
+
+        By default, each channel keeps a reference to the blocks it has
+        not consumed yet. If _maxlag_ is given, channels share a bounded
+        buffer instead: a channel can not read more than _maxlag_ samples
+        ahead of the others (a `BufferError` is raised otherwise), and
+        data consumed by all channels are freed, so they can't be read
+        again. See `_boundedDemux`.
+    """
+    if maxlag is not None:
+        channels = _boundedDemux(count, source, maxlag)
+    else:
+        channels = _demux(count, source)
+
+    return [fingerprint.tag(c, 'demux', n, count, sources=(source,)) for n, c in enumerate(channels)]
+
+def _demux(count, source):
+    """ Demux a multi-channel source, each channel caching the blocks
+        it has not consumed yet.
     """
     def channel(n, source, offset, cache, cont):
         loaded = False
@@ -71,10 +159,83 @@ def demux(count, source):
             else:
                 return data, channel(n, source, stop, cache, cont)
 
-        return read
+        if hasattr(source, 'skip'):
+            read.skip = lambda k : channel(n, source.skip(offset+k), 0, None, None)
+
+        total = length.of(source)
+        return length.tag(read, None if total is None else total-offset)
 
     return [channel(n, source, 0, None, None) for n in range(count)]
 
+def _boundedDemux(count, source, maxlag):
+    """ Demux a multi-channel source through a shared buffer holding at
+        most _maxlag_ samples per channel.
+
+        Each channel exposes the buffer statistics as its `stats`
+        attribute (`buffered_bytes` and `peak_bytes`).
+    """
+    nchannels = count
+    blocks = deque()
+    heads = [0]*nchannels
+    state = SimpleNamespace(start=0, end=0, cont=source, exhausted=False, buffered_bytes=0, peak_bytes=0)
+    total = length.of(source)
+
+    def load(count):
+        available = maxlag-(state.end-min(heads))
+        if available <= 0:
+            lagging = heads.index(min(heads))
+            raise BufferError("demux: channel {} lags more than {} samples behind".format(lagging, maxlag))
+
+        block, state.cont = state.cont(min(count, available))
+        if not block:
+            state.exhausted = True
+            return
+
+        blocks.append((state.end, block))
+        state.end += len(block[0])
+        state.buffered_bytes += len(block[0])*nchannels*SAMPLE_SIZE
+        state.peak_bytes = max(state.peak_bytes, state.buffered_bytes)
+
+    def evict():
+        low = min(heads)
+        while blocks:
+            start, block = blocks[0]
+            if start+len(block[0]) > low:
+                break
+
+            blocks.popleft()
+            state.start = start+len(block[0])
+            state.buffered_bytes -= len(block[0])*nchannels*SAMPLE_SIZE
+
+    def channel(n, position):
+        def read(count):
+            if position < state.start:
+                raise BufferError("demux: samples at {} have already been released".format(position))
+
+            while position >= state.end and not state.exhausted:
+                load(count)
+
+            if position >= state.end:
+                return generator.samples(), read
+
+            for start, block in blocks:
+                if position < start+len(block[0]):
+                    break
+
+            offset = position-start
+            data = block[n][offset:offset+count]
+            stop = position+len(data)
+            if stop > heads[n]:
+                heads[n] = stop
+                evict()
+
+            return data, channel(n, stop)
+
+        read.stats = state
+        return length.tag(read, None if total is None else total-position)
+
+    return [channel(n, 0) for n in range(nchannels)]
+
 def rawdata(*data):
     """ Create a multichannel source from hard-coded data. Mostly used for
         testing purposes.
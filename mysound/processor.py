@@ -4,34 +4,92 @@
     Processors can do things like resampling a signal, reproducing
     it on several channels or mixing several channels together
 """
+import itertools
 import math
 
+from math import gcd
+
+from mysound import fingerprint
+from mysound import graph
+from mysound import length
+from mysound.context import Context
+from mysound.time import to_samples
+from mysound.backend import current, Constant, constants
 from mysound.generator import samples
-from mysound.multichannel import mux
+from mysound import multichannel
+from mysound.multichannel import mux, demux
+from mysound.actions import rechunk
 
 def eof(*args):
     return [], eof
 
+# Number of samples read at once by `materialize` when it can't preallocate
+MATERIALIZE_BLOCK_SIZE = 10*1024
+
 def take(count, source):
-    """ Take *exactly* _count_ samples from _source_
+    """ Take *exactly* _count_ samples from _source_, or less if the source
+        is exhausted before
     """
     # XXX Does this really belong to this module?
+    return materialize(source, count)
+
+def materialize(source, count=None):
+    """ Read the samples of _source_ into a single array, up to _count_
+        samples or until the source is exhausted.
+
+        If the number of samples to read is known (from _count_ or from the
+        length hint of the source), the array is allocated once and filled
+        in place.
+
+        Return the array and the continuation of the source.
+    """
+    hint = length.of(source)
+    if count is None and hint == length.INFINITE:
+        raise ValueError("Can't materialize an endless source")
+
+    size = hint if count is None else count if hint is None else min(count, hint)
+
+    backend = current()
+    buffer = backend.zeros(size) if size is not None else None
+    filled = 0
+    extra = []
     cont = source
+    position = 0
+    while count is None or position < count:
+        if buffer is not None and filled < len(buffer):
+            n = len(buffer)-filled
+        else:
+            n = MATERIALIZE_BLOCK_SIZE if count is None else count-position
+
+        data, cont = cont(n)
+        if not len(data):
+            break
+
+        if not extra and buffer is not None and filled+len(data) <= len(buffer):
+            backend.assign(buffer, filled, data)
+            filled += len(data)
+        else:
+            extra.append(data)
+        position += len(data)
 
-    result = samples()
-    while count > 0:
-        data, cont = cont(count)
-        count -= len(data)
-        result.extend(data)
+    if buffer is None:
+        return backend.concat(extra), cont
+
+    result = buffer[:filled] if filled < len(buffer) else buffer
+    if extra:
+        result = backend.concat([result, *extra])
 
     return result, cont
 
 
 def apply(fct, *channels):
     """ Apply a function on each samples in turn
+
+        When all the input channels are constant over a chunk,
+        _fct_ is called only once for the whole chunk.
     """
 
-    src = mux(*channels)
+    src = mux(*channels, fill=True)
 
     def _apply(fct, src):
         def read(n):
@@ -39,29 +97,574 @@ def apply(fct, *channels):
             if not chunk:
                 return eof()
 
+            values = constants(chunk)
+            if values is not None:
+                return Constant(fct(tuple(values)), len(chunk[0])), _apply(fct, cont)
+
             return samples(map(fct, zip(*chunk))), _apply(fct, cont)
 
+        if hasattr(src, 'skip'):
+            read.skip = lambda n : _apply(fct, src.skip(n))
+
+        return length.tag(read, length.of(src))
+
+    result = fingerprint.tag(_apply(fct, src), 'apply', fingerprint.function(fct), sources=channels)
+    return graph.tag(result, 'apply', fct, sources=channels)
+
+def applyBlock(fct, *channels, outputs=None):
+    """ Apply a function on whole chunks of data
+
+        _fct_ is called with the per-channel arrays of each chunk (all of
+        the same length), and returns an array holding the same number
+        of samples. Plain lists are accepted too. Constant chunks (see
+        `backend.Constant`) are expanded before calling _fct_, so it always
+        receives arrays of the current backend.
+
+        If _outputs_ is given, _fct_ returns a sequence of _outputs_ arrays,
+        and `applyBlock` returns the corresponding list of channels.
+    """
+    src = mux(*channels, fill=True)
+
+    def _chunk(data):
+        if isinstance(data, (list, tuple)):
+            return samples(data)
+
+        return data
+
+    def _apply(fct, src):
+        def read(n):
+            chunk, cont = src(n)
+            if not chunk:
+                return eof() if outputs is None else multichannel.eof()
+
+            result = fct(*[c.expand() if type(c) is Constant else c for c in chunk])
+            if outputs is None:
+                result = _chunk(result)
+            else:
+                result = [_chunk(data) for data in result]
+
+            return result, _apply(fct, cont)
+
+        if hasattr(src, 'skip'):
+            read.skip = lambda n : _apply(fct, src.skip(n))
+
+        return length.tag(read, length.of(src))
+
+    result = fingerprint.tag(_apply(fct, src), 'applyBlock', fingerprint.function(fct), outputs or 0, sources=channels)
+    if outputs is None:
+        return result
+
+    return demux(outputs, result)
+
+def matrix(gains, *channels, precise=False):
+    """ Mix N input channels into M output channels
+
+        _gains_ is a M-rows, N-columns matrix: the output channel _m_ is the
+        sum of the input channels weighted by the coefficients of the row _m_.
+        Zero coefficients are skipped, so sparse matrices (like downmixing
+        several stereo pairs) are cheap.
+
+        By default, the sums use floating-point additions. If _precise_ is
+        true, they are computed using `math.fsum`, like `mean`.
+
+        Return the list of the M output channels.
+    """
+    gains = tuple(tuple(float(g) for g in row) for row in gains)
+    for row in gains:
+        if len(row) != len(channels):
+            raise TypeError("The gain matrix must have one column per input channel")
+
+    src = mux(*channels, fill=True)
+
+    def _mix(src):
+        def read(n):
+            chunk, cont = src(n)
+            if not chunk:
+                return multichannel.eof()
+
+            return current().mix(chunk, gains, precise), _mix(cont)
+
+        if hasattr(src, 'skip'):
+            read.skip = lambda n : _mix(src.skip(n))
+
+        return length.tag(read, length.of(src))
+
+    result = fingerprint.tag(_mix(src), 'matrix', gains, bool(precise), sources=channels)
+    return demux(len(gains), result)
+
+# Largest FFT partition used by default by `convolve`
+MAX_PARTITION = 4096
+
+def convolve(impulse, source, partition=None):
+    """ Convolve a channel with an impulse response, given as a sequence
+        of samples (for example, a channel read using `fileformats.load`).
+
+        The convolution is computed block by block using FFTs and
+        overlap-add. The impulse response is split into partitions of
+        _partition_ samples (a power of two, by default the length of the
+        impulse response rounded up, capped to `MAX_PARTITION`), so the
+        cost per sample grows with the logarithm of the impulse response
+        length up to that size, and long impulse responses don't require
+        huge transforms.
+
+        The output is len(impulse)-1 samples longer than the input, so
+        reverb tails are preserved.
+    """
+    impulse = samples(impulse)
+    m = len(impulse)
+    if partition is None:
+        partition = min(1<<max(m-1, 0).bit_length(), MAX_PARTITION)
+
+    backend = current()
+    kernels = [backend.rfft(impulse[i:i+partition], 2*partition) for i in range(0, m, partition)]
+    src = rechunk(source, partition)
+
+    def _convolve(src, spectra, overlap, remaining, block, offset):
+        def read(n):
+            if offset < len(block):
+                stop = offset+n
+                return block[offset:stop], _convolve(src, spectra, overlap, remaining, block, stop)
+
+            if remaining == 0:
+                return eof()
+
+            left = remaining
+            cont = src
+            if left is None:
+                data, cont = src(partition)
+                nread = len(data)
+                if nread < partition:
+                    # end of input: flush the tail of the convolution
+                    left = nread+m-1
+            else:
+                data = ()
+                nread = 0
+
+            if not nread or (type(data) is Constant and data.value == 0.0):
+                spectrum = None
+            else:
+                spectrum = backend.rfft(data, 2*partition)
+
+            new_spectra = ((spectrum,) + spectra)[:len(kernels)]
+            new_block, new_overlap = backend.convolve_block(new_spectra, kernels, overlap)
+            if left is not None:
+                new_block = new_block[:left]
+                left -= len(new_block)
+
+            return _convolve(cont, new_spectra, new_overlap, left, new_block, 0)(n)
+
+        pending = remaining if remaining is not None else length.of(src)
+        if pending is not None and remaining is None:
+            pending += m-1
+
+        return length.tag(read, None if pending is None else pending+len(block)-offset)
+
+    result = _convolve(src, (), [0.0]*partition, None, samples(), 0)
+    return fingerprint.tag(result, 'convolve', tuple(impulse), partition, sources=(source,))
+
+#
+# Resampling quality: the number of zero crossings of the windowed sinc on
+# each side of its center, and the beta parameter of the Kaiser window
+#
+QUALITY_LOW = "low"
+QUALITY_MEDIUM = "medium"
+QUALITY_HIGH = "high"
+
+QUALITIES = {
+    QUALITY_LOW: (8, 5.0),
+    QUALITY_MEDIUM: (16, 7.0),
+    QUALITY_HIGH: (32, 9.0),
+}
+
+# Number of input samples read at once by `resample`
+RESAMPLE_BLOCK_SIZE = 4096
+
+_POLYPHASE_TABLES = {}
+
+def _bessel0(x):
+    """ Modified Bessel function of the first kind, order 0
+    """
+    result = term = 1.0
+    k = 1
+    while term > 1e-12*result:
+        term *= (x/(2*k))**2
+        result += term
+        k += 1
+
+    return result
+
+def _polyphase(irate, orate, quality):
+    """ Return the polyphase filter bank converting from _irate_ to _orate_
+
+        The result is a (up, down, width, phases) tuple, where up/down is
+        the conversion ratio, and phases[p] the _width_ taps filter computing
+        an output sample located p/up samples after an input sample.
+        Tables are computed once per (irate, orate, quality).
+    """
+    key = (irate, orate, quality)
+    table = _POLYPHASE_TABLES.get(key)
+    if table is None:
+        crossings, beta = QUALITIES[quality]
+        d = gcd(irate, orate)
+        up, down = orate//d, irate//d
+        cutoff = min(1.0, up/down)
+        half = math.ceil(crossings/cutoff)
+        width = 2*half
+        norm = _bessel0(beta)
+
+        phases = []
+        for p in range(up):
+            taps = []
+            for k in range(-half+1, half+1):
+                t = k-p/up
+                x = cutoff*t
+                sinc = math.sin(math.pi*x)/(math.pi*x) if x else 1.0
+                r = t/half
+                window = _bessel0(beta*math.sqrt(1-r*r))/norm if abs(r) < 1 else 0.0
+                taps.append(sinc*window)
+
+            total = math.fsum(taps)
+            phases.append(tuple(tap/total for tap in taps))
+
+        table = _POLYPHASE_TABLES[key] = (up, down, width, tuple(phases))
+
+    return table
+
+def resample(ctx, srate, source, quality=QUALITY_MEDIUM):
+    """ Convert a channel sampled at `ctx.srate` to the _srate_ sampling rate,
+        using a windowed sinc polyphase filter.
+
+        Return the new context and the converted channel.
+    """
+    newctx = Context(srate=srate)
+    if srate == ctx.srate:
+        return newctx, source
+
+    up, down, width, phases = _polyphase(ctx.srate, srate, quality)
+    half = width//2
+    backend = current()
+
+    def _resample(src, buffer, base, first, end):
+        """ _buffer_ holds the input samples from the index _base_, _first_ is
+            the index of the next output sample, and _end_ the length of the
+            input once known.
+        """
+        def read(n):
+            cont, data, stop = src, buffer, end
+            if stop is not None:
+                n = min(n, -(-stop*up//down)-first)
+                if n <= 0:
+                    return eof()
+
+            need = ((first+n-1)*down)//up + half + 1
+            chunks = [data]
+            available = base+len(data)
+            while stop is None and available < need:
+                chunk, cont = cont(max(need-available, RESAMPLE_BLOCK_SIZE))
+                if not len(chunk):
+                    stop = available
+                    n = min(n, -(-stop*up//down)-first)
+                    if n <= 0:
+                        return eof()
+                    break
+
+                chunks.append(chunk)
+                available += len(chunk)
+
+            if available < need:
+                chunks.append(backend.constant(0.0, need-available))
+            data = backend.concat(chunks)
+
+            starts = []
+            indices = []
+            for j in range(first, first+n):
+                i, p = divmod(j*down, up)
+                starts.append(i-half+1-base)
+                indices.append(p)
+
+            result = backend.polyphase(data, phases, starts, indices)
+
+            # drop the samples no longer needed by the next outputs
+            keep = ((first+n)*down)//up-half+1
+            data = data[keep-base:available-base]
+
+            return result, _resample(cont, data, keep, first+n, stop)
+
+        return length.tag(read, None if total is None else total-first)
+
+    total = length.of(source)
+    if total is not None:
+        total = -(-total*up//down) if total != length.INFINITE else total
+
+    result = _resample(source, backend.constant(0.0, half-1), -half+1, 0, None)
+    return newctx, fingerprint.tag(result, 'resample', ctx.srate, srate, quality, sources=(source,))
+
+def _coefficient(ctx, duration):
+    """ Return the smoothing coefficient of a one-pole filter whose time
+        constant is _duration_
+    """
+    n = to_samples(ctx, duration)
+    return math.exp(-1.0/n) if n > 0 else 0.0
+
+def envelope(ctx, attack, release, source):
+    """ Peak envelope follower
+
+        The envelope rises toward the absolute value of the samples
+        with the _attack_ time constant, and decays with the _release_
+        one. Both durations are expressed in samples or using any of
+        the `mysound.time` formats.
+    """
+    a = _coefficient(ctx, attack)
+    r = _coefficient(ctx, release)
+
+    def _envelope(src, level):
+        def read(n):
+            data, cont = src(n)
+            if not len(data):
+                return eof()
+
+            result = []
+            y = level
+            for x in data:
+                x = abs(x)
+                y = x + (a if x > y else r)*(y-x)
+                result.append(y)
+
+            return samples(result), _envelope(cont, y)
+
+        return length.tag(read, length.of(src))
+
+    return fingerprint.tag(_envelope(source, 0.0), 'envelope', a, r, sources=(source,))
+
+def _block(chunks):
+    """ Join the chunks of a block, stored as a linked list `(chunk, previous)`
+        starting from the last chunk
+    """
+    result = []
+    while chunks is not None:
+        chunk, chunks = chunks
+        result.append(chunk)
+
+    return list(itertools.chain.from_iterable(reversed(result)))
+
+def rms(ctx, window, source):
+    """ Sliding root mean square of a channel over the last _window_ samples
+        (the samples before the start of the channel count as silence).
+
+        The squares are grouped in blocks of _window_ samples, so the square
+        leaving the window is the one at the same position in the previous
+        block. The sum of the squares is updated for each sample, and
+        recomputed exactly at the end of each block to prevent rounding
+        errors from accumulating.
+
+        The continuations share the blocks without copying them, so reading
+        _n_ samples takes O(n) time whatever the size of the window.
+    """
+    w = to_samples(ctx, window)
+    assert w > 0, "The window must hold at least one sample"
+
+    def _rms(src, previous, chunks, position, total):
+        def read(n):
+            data, cont = src(n)
+            if not len(data):
+                return eof()
+
+            prev, blocks, i, t = previous, chunks, position, total
+            squares = []
+            result = []
+            for x in data:
+                sq = x*x
+                t += sq-prev[i]
+                squares.append(sq)
+                i += 1
+                if i == w:
+                    prev = _block((squares, blocks))
+                    t = math.fsum(prev)
+                    blocks, squares, i = None, [], 0
+
+                result.append(math.sqrt(t/w) if t > 0.0 else 0.0)
+
+            if squares:
+                blocks = (squares, blocks)
+
+            return samples(result), _rms(cont, prev, blocks, i, t)
+
+        return length.tag(read, length.of(src))
+
+    return fingerprint.tag(_rms(source, [0.0]*w, None, 0, 0.0), 'rms', w, sources=(source,))
+
+def _sliding(ctx, window, source, name, best):
+    """ Sliding extremum of a channel over the last _window_ samples.
+
+        The samples are grouped in blocks of _window_ samples (van Herk/Gil-Werman
+        algorithm): the window ending at a sample covers the end of the
+        previous block and the start of the current one, so the extremum is
+        the _best_ of the suffix extremum of the previous block and of the
+        running extremum of the current block. The suffix extrema are
+        computed once per block.
+
+        The continuations share the blocks without copying them, so reading
+        _n_ samples takes O(n) time whatever the size of the window.
+    """
+    w = to_samples(ctx, window)
+    assert w > 0, "The window must hold at least one sample"
+
+    def _extremum(src, suffix, chunks, position, running):
+        def read(n):
+            data, cont = src(n)
+            if not len(data):
+                return eof()
+
+            tail, blocks, i, p = suffix, chunks, position, running
+            values = []
+            result = []
+            for x in data:
+                p = best(p, x) if i else x
+                result.append(best(tail[i+1], p) if tail is not None and i+1 < w else p)
+                values.append(x)
+                i += 1
+                if i == w:
+                    block = _block((values, blocks))
+                    tail = list(itertools.accumulate(reversed(block), best))[::-1]
+                    blocks, values, i = None, [], 0
+
+            if values:
+                blocks = (values, blocks)
+
+            return samples(result), _extremum(cont, tail, blocks, i, p)
+
+        return length.tag(read, length.of(src))
+
+    return fingerprint.tag(_extremum(source, None, None, 0, None), name, w, sources=(source,))
+
+def slidingMax(ctx, window, source):
+    """ Maximum of a channel over the last _window_ samples
+    """
+    return _sliding(ctx, window, source, 'slidingMax', max)
+
+def slidingMin(ctx, window, source):
+    """ Minimum of a channel over the last _window_ samples
+    """
+    return _sliding(ctx, window, source, 'slidingMin', min)
+
+#
+# Analysis windows, as functions of the sample index and the window size.
+# The windows are periodic, so overlapping them with a hop of half their size
+# (or a quarter for the Blackman window) sums to a constant.
+#
+HANN = "hann"
+HAMMING = "hamming"
+BLACKMAN = "blackman"
+RECTANGULAR = "rectangular"
+
+WINDOWS = {
+    HANN: lambda k, n : 0.5-0.5*math.cos(2*math.pi*k/n),
+    HAMMING: lambda k, n : 0.54-0.46*math.cos(2*math.pi*k/n),
+    BLACKMAN: lambda k, n : 0.42-0.5*math.cos(2*math.pi*k/n)+0.08*math.cos(4*math.pi*k/n),
+    RECTANGULAR: lambda k, n : 1.0,
+}
+
+_WINDOW_TABLES = {}
+
+def _window(name, size):
+    """ Return the _size_ samples analysis window _name_, as an array of
+        the current backend. It is computed once per size and backend.
+    """
+    backend = current()
+    key = (backend.name, name, size)
+    table = _WINDOW_TABLES.get(key)
+    if table is None:
+        f = WINDOWS[name]
+        table = _WINDOW_TABLES[key] = backend.window(f(k, size) for k in range(size))
+
+    return table
+
+def stft(source, size=1024, hop=None, nfft=None, window=HANN, magnitude=True):
+    """ Short-time Fourier transform of a channel
+
+        Return a source of frames: when called with a number of frames,
+        it returns a list of at most that many frames, and its continuation.
+        Each frame is the spectrum (nfft//2+1 bins) of _size_ samples
+        multiplied by the _window_; consecutive frames are _hop_ samples
+        apart (by default, half the frame size). The frames are zero-padded
+        to _nfft_ samples (by default, the frame size), which must be a power
+        of two. If _magnitude_ is true, the frames hold the magnitudes of the
+        bins, otherwise their complex values.
+
+        Only complete frames are produced. The channel is read progressively,
+        each sample being read once, so `stft` can process a channel read
+        from a file without loading the whole file.
+    """
+    hop = hop or size//2
+    nfft = nfft or size
+    assert 0 < hop, "The hop must be at least one sample"
+    assert size <= nfft, "The FFT size must not be smaller than the frame size"
+
+    w = _window(window, size)
+    backend = current()
+
+    def _stft(src, pending, drop):
+        """ _pending_ holds the samples from the start of the next frame.
+            When the hop is larger than the frame size, the next frame may
+            start after the samples read so far: _drop_ is then the number
+            of samples to discard before it.
+        """
+        def read(count):
+            cont = src
+            remaining = drop
+            while remaining > 0:
+                data, cont = cont(remaining)
+                if not len(data):
+                    return eof()
+
+                remaining -= len(data)
+
+            need = size+(count-1)*hop
+            chunks = [pending]
+            available = len(pending)
+            while available < need:
+                data, cont = cont(need-available)
+                if not len(data):
+                    break
+
+                chunks.append(data)
+                available += len(data)
+
+            if available < size:
+                return eof()
+
+            data = backend.concat(chunks) if len(chunks) > 1 else pending
+            nframes = min(count, (available-size)//hop+1)
+            frames = [backend.spectrum(data[k*hop:k*hop+size], w, nfft, magnitude) for k in range(nframes)]
+
+            start = nframes*hop
+            return frames, _stft(cont, data[start:], max(start-available, 0))
+
         return read
 
-    return _apply(fct, src)
+    result = _stft(source, samples(), 0)
+    return fingerprint.tag(result, 'stft', size, hop, nfft, window, bool(magnitude), sources=(source,))
 
 def mean(*channels):
     """ Return one channel that is the arithmetic average
         of all input channels
     """
-    nchannels = len(channels)
-    src = mux(*channels)
+    src = mux(*channels, fill=True)
 
-    def _apply(fct, src):
+    def _apply(src):
         def read(n):
             chunk, cont = src(n)
             if not chunk:
                 return eof()
 
-            return samples([fct(vector)/nchannels for vector in zip(*chunk)]), _apply(fct, cont)
+            return current().mean(chunk), _apply(cont)
 
-        return read
+        if hasattr(src, 'skip'):
+            read.skip = lambda n : _apply(src.skip(n))
+
+        return length.tag(read, length.of(src))
 
-    return _apply(math.fsum, src)
+    result = fingerprint.tag(_apply(src), 'mean', sources=channels)
+    return graph.tag(result, 'mean', sources=channels)
 
 
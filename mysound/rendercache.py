@@ -0,0 +1,139 @@
+""" Persistent render cache
+
+    Rendered channels are stored on disk, under a name derived from
+    their structural fingerprint (see `mysound.fingerprint`). When an
+    identical graph is rendered again--even from another process--its
+    samples are streamed from the cache instead of being recomputed.
+
+    Cache entries are raw little-endian float32 samples. A channel is
+    only stored once it has been read from its start to its end, so
+    infinite channels are never cached.
+"""
+
+import os
+import tempfile
+import weakref
+
+from mysound import fingerprint
+from mysound import length
+from mysound.backend import current
+from mysound.fileformats import blockReader
+from mysound.multichannel import demux
+
+SUFFIX = ".f32"
+
+class _RawReader:
+    """ Reader for the raw float32 files of the cache
+    """
+    def __init__(self, path):
+        self.stream = open(path, 'rb')
+        self.dataLength = os.fstat(self.stream.fileno()).st_size//4
+
+    def close(self):
+        self.stream.close()
+
+    @property
+    def nchannels(self):
+        return 1
+
+    def seek(self, offset):
+        self.stream.seek(4*offset)
+
+    def read(self, count):
+        buffer = self.stream.read(4*count)
+        if not buffer:
+            return None
+
+        return current().decode_float32(buffer, 1)
+
+def path(directory, source):
+    """ Return the path of the cache entry for _source_, or `None` if the
+        source has no fingerprint
+    """
+    key = fingerprint.of(source)
+    if key is None:
+        return None
+
+    return os.path.join(directory, key+SUFFIX)
+
+def cached(source, directory):
+    """ Return a channel producing the same samples as _source_, backed by
+        the render cache in _directory_.
+
+        If the cache already holds the samples of _source_, they are read
+        from it. Otherwise, samples are recorded as they are read, and stored
+        in the cache when the end of the channel is reached. Sources with no
+        fingerprint are returned unchanged.
+
+        If _source_ can skip samples, so can the returned channel, so it can
+        still be rendered in parallel (see `fileformats.toFile`). Skipped
+        channels, and the worker processes rendering them, don't record
+        anything: samples rendered in parallel are not stored in the cache.
+    """
+    target = path(directory, source)
+    if target is None:
+        return source
+
+    if os.path.exists(target):
+        channel, = demux(1, blockReader(_RawReader(target)))
+        channel.fingerprint = source.fingerprint
+        return channel
+
+    channel = _recording(source, _Recording(directory, target), 0)
+    channel.fingerprint = source.fingerprint
+    return channel
+
+class _Recording:
+    """ A cache entry being written
+    """
+    def __init__(self, directory, target):
+        fd, self.tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        self.stream = os.fdopen(fd, 'wb')
+        self.target = target
+        self.written = 0
+        self.done = False
+
+        # Entries are only written by the process that created them, not
+        # by the forked workers of a parallel rendering
+        self.pid = os.getpid()
+
+        # Remove partial entries when the channel is dropped before its end
+        weakref.finalize(self, _discard, self.stream, self.tmp, self.pid)
+
+    def record(self, position, data):
+        """ Record the samples of _data_ if they start at the end
+            of the already recorded samples
+        """
+        if position != self.written or self.done or os.getpid() != self.pid:
+            return
+
+        if len(data):
+            self.stream.write(current().encode_float32([data]))
+            self.written += len(data)
+        else:
+            self.stream.close()
+            os.replace(self.tmp, self.target)
+            self.done = True
+
+def _discard(stream, tmp, pid):
+    """ Remove a partial cache entry
+    """
+    if os.getpid() != pid:
+        return
+
+    stream.close()
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+def _recording(source, recording, position):
+    def read(count):
+        data, cont = source(count)
+        recording.record(position, data)
+
+        return data, _recording(cont, recording, position+len(data))
+
+    if hasattr(source, 'skip'):
+        # the skipped samples are missing, so there is nothing to record
+        read.skip = source.skip
+
+    return length.tag(read, length.of(source))
@@ -5,8 +5,22 @@
 
 
 from mysound.fileformats import WRITER
+from mysound.rendercache import cached
 
 WAVE_FILE="WAVE"
-def sink(ctx, *args, format=WAVE_FILE):
-    return WRITER[format](ctx, *args)
+WAVE_STREAM="WAVE_STREAM"
+def sink(ctx, src, *args, format=WAVE_FILE, cache=None, **kwargs):
+    """ Write the channels of _src_ using the given format.
+
+        If _cache_ is the path to a directory, channels are read from,
+        or stored into, the render cache held in that directory.
+        Channels rendered in parallel are read from the cache, but not
+        stored into it.
+        Other keyword arguments (like _workers_ for parallel rendering, or
+        _progress_ for progress reports) are passed to the writer.
+    """
+    if cache is not None:
+        src = [cached(channel, cache) for channel in src]
+
+    return WRITER[format](ctx, src, *args, **kwargs)
 
@@ -1,9 +1,15 @@
 import unittest
+import gc
 
 from random import randint, uniform
 
+from mysound.context import Context
 from mysound.generator import rawdata, call
 from mysound.processor import take
+from mysound.multichannel import mux
+from mysound.fileformats import fromFile
+from mysound.fileformats.dummy import Reader
+from mysound.time import seconds
 
 from mysound.actions import *
 
@@ -51,5 +57,169 @@ class TestActions(unittest.TestCase):
         d21, cont = take(90, src)
         d22, cont = take(10, cont)
 
-        self.assertSequenceEqual(d11+d12, d21+d22)
+        self.assertSequenceEqual(list(d11)+list(d12), list(d21)+list(d22))
 
+
+    def test_4(self):
+        """ `skip` should discard the first samples of a source
+        """
+        ctx = Context(srate=10)
+        data = list(range(100))
+
+        for src in (rawdata(data), call(iter(data).__next__)):
+            d, cont = take(20, skip(ctx, seconds(3.5), src))
+            self.assertEqual(list(d), data[35:55])
+
+    def test_5(self):
+        """ `truncate` should end the stream after the given duration
+        """
+        ctx = Context(srate=10)
+        src = truncate(ctx, seconds(1), rawdata(list(range(100))))
+
+        result = []
+        while True:
+            data, src = src(3)
+            if not len(data):
+                break
+            result.extend(data)
+
+        self.assertEqual(result, list(range(10)))
+
+    def test_6(self):
+        """ `slice` should work on multichannel sources
+        """
+        ctx = Context(srate=10)
+        src = slice(ctx, 5, 12, mux(rawdata(list(range(100))), rawdata(list(range(100, 200)))))
+
+        d1 = []
+        d2 = []
+        while True:
+            data, src = src(4)
+            if data is None:
+                break
+            d1.extend(data[0])
+            d2.extend(data[1])
+
+        self.assertEqual(d1, list(range(5, 12)))
+        self.assertEqual(d2, list(range(105, 112)))
+
+    def test_7(self):
+        """ Skipping in a file-backed source should seek rather than read
+        """
+        offsets = []
+        class CountingReader(Reader):
+            def read(self, count):
+                offsets.append(self.offset)
+                return super().read(count)
+
+        data = (
+          tuple(range(-100, 100)),
+          tuple(range(-50, 150)),
+        )
+        ctx, (ch1, ch2) = fromFile(CountingReader, data)
+        d, cont = take(6, slice(ctx, 150, 160, ch2))
+
+        self.assertEqual(list(d), list(data[1][150:156]))
+        self.assertTrue(all(offset >= 150 for offset in offsets))
+
+    def test_8(self):
+        """ `rechunk` should return full blocks from a fragmented source
+        """
+        data = [float(v) for v in range(100)]
+        src = rechunk(pick(3, rawdata(data), skip(Context(srate=10), 3, loop(rawdata(data[:7])))), 10)
+
+        result = []
+        sizes = []
+        for i in range(12):
+            chunk, src = src(50)
+            sizes.append(len(chunk))
+            result.extend(chunk)
+
+        self.assertEqual(sizes, [10]*12)
+        self.assertEqual(result[:3], data[:3])
+        self.assertEqual(result[3:10], data[3:7] + data[:3])
+
+    def test_9(self):
+        """ `rechunk` should work on multichannel sources and only
+            return a short block at the end of the stream
+        """
+        data = (
+          tuple(range(-10, 13)),
+          tuple(range(-5, 18)),
+        )
+        ctx, channels = fromFile(Reader, data)
+        src = rechunk(mux(*channels), 7)
+
+        sizes = []
+        d1 = []
+        d2 = []
+        while True:
+            chunk, src = src(100)
+            if chunk is None:
+                break
+            sizes.append(len(chunk[0]))
+            d1.extend(chunk[0])
+            d2.extend(chunk[1])
+
+        self.assertEqual(sizes, [7, 7, 7, 2])
+        self.assertSequenceEqual(d1, data[0])
+        self.assertSequenceEqual(d2, data[1])
+
+    def test_10(self):
+        """ Bounded caching should ensure repeatability while
+            spilling the least recently used chunks
+        """
+        src = caching(call(lambda : uniform(-1.0,1.0)), max_bytes=64)
+
+        d11, cont = take(10, src)
+        d12, cont = take(90, cont)
+
+        d21, cont = take(90, src)
+        d22, cont = take(10, cont)
+
+        self.assertSequenceEqual(list(d11)+list(d12), list(d21)+list(d22))
+        self.assertGreater(src.stats.spills, 0)
+        self.assertGreater(src.stats.reloads, 0)
+        self.assertLessEqual(src.stats.nbytes, 90*4)
+
+    def test_11(self):
+        """ Bounded caching should work on multichannel sources
+        """
+        data = (
+          tuple(range(-10, 10)),
+          tuple(range(-5, 15)),
+        )
+        src = caching(mux(rawdata(data[0]), rawdata(data[1])), max_bytes=16)
+
+        for i in range(2):
+            cont = src
+            d1 = []
+            d2 = []
+            while True:
+                chunk, cont = cont(3)
+                if chunk is None:
+                    break
+                d1.extend(chunk[0])
+                d2.extend(chunk[1])
+
+            self.assertSequenceEqual(d1, data[0])
+            self.assertSequenceEqual(d2, data[1])
+
+    def test_12(self):
+        """ Bounded caching should reuse the spill file space of the
+            chunks no longer referenced
+        """
+        src = caching(call(lambda : uniform(-1.0,1.0)), max_bytes=64)
+        stats = src.stats
+
+        # keep the last continuations alive, so their chunks are spilled
+        window = []
+        for i in range(200):
+            data, src = src(16)
+            window = [src, *window[:7]]
+            # the chunks are held in reference cycles
+            gc.collect()
+
+        self.assertGreater(stats.spills, 100)
+        self.assertLessEqual(stats.spill_file.seek(0, 2), 8*16*4)
+        self.assertLessEqual(len(stats.lru), 2)
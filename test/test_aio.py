@@ -0,0 +1,118 @@
+import unittest
+
+import asyncio
+import os.path
+import sys
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+from mysound import aio
+from mysound.actions import skip
+from mysound.context import Context
+from mysound.generator import ramp
+from mysound.fileformats.wave import Reader
+from mysound.sink import sink
+
+SRC_FILE = os.path.join('.', 'test', 'data', 'pcm_int16_2.wav')
+
+class TestAsyncio(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_1(self):
+        """ Awaitable reads should produce the same data as synchronous reads
+        """
+        async def main():
+            ctx, src = await aio.source(SRC_FILE)
+            channel = src[0]
+            result = []
+            while True:
+                data, channel = await aio.read(channel, 1000)
+                if not len(data):
+                    break
+                result.extend(data)
+
+            return result
+
+        with Reader(SRC_FILE) as wav:
+            expected = list(wav.read(1<<20)[0])
+
+        self.assertEqual(asyncio.run(main()), expected)
+
+    def test_2(self):
+        """ The streamed Wav data should be the same as a file written by a sink
+        """
+        ctx = Context(srate=1000)
+        path = os.path.join(self.tmp.name, "ramp.wav")
+        sink(ctx, [ramp(ctx, 5000), ramp(ctx, 5000, 1.0, -1.0)], path)
+
+        async def main(**kwargs):
+            chunks = []
+            async for chunk in aio.stream(ctx, [ramp(ctx, 5000), ramp(ctx, 5000, 1.0, -1.0)], blocksize=700, **kwargs):
+                chunks.append(chunk)
+
+            return b''.join(chunks)
+
+        with open(path, 'rb') as f:
+            expected = f.read()
+
+        self.assertEqual(asyncio.run(main(nFrames=5000)), expected)
+
+        unknown = asyncio.run(main())
+        self.assertEqual(len(unknown), len(expected))
+        self.assertEqual(unknown[4:8], b'\xff\xff\xff\xff')
+
+    def test_3(self):
+        """ Many renders can be streamed concurrently from a single event loop
+        """
+        ctx = Context(srate=1000)
+
+        async def render():
+            size = 0
+            async for chunk in aio.stream(ctx, [ramp(ctx, 2000)], blocksize=100):
+                size += len(chunk)
+
+            return size
+
+        async def main():
+            return await asyncio.gather(*[render() for _ in range(50)])
+
+        sizes = asyncio.run(main())
+        self.assertEqual(len(set(sizes)), 1)
+
+    def test_4(self):
+        """ Concurrent reads of channels of the same file should produce the same
+            data as serial reads
+        """
+        offsets = (0, 50, 333)
+
+        async def readAll(channel, executor):
+            result = []
+            while True:
+                data, channel = await aio.read(channel, 100, executor=executor)
+                if not len(data):
+                    return result
+                result.extend(data)
+
+        async def main(executor):
+            ctx, src = await aio.source(SRC_FILE)
+            channels = [skip(ctx, offset, channel) for offset in offsets for channel in src]
+            return await asyncio.gather(*[readAll(channel, executor) for channel in channels])
+
+        with Reader(SRC_FILE) as wav:
+            data = [list(channel) for channel in wav.read(1<<20)]
+        expected = [channel[offset:] for offset in offsets for channel in data]
+
+        # switch threads as often as possible to expose races
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with ThreadPoolExecutor(8) as executor:
+                for _ in range(5):
+                    self.assertEqual(asyncio.run(main(executor)), expected)
+        finally:
+            sys.setswitchinterval(interval)
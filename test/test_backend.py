@@ -0,0 +1,139 @@
+import unittest
+
+import random
+
+from array import array
+
+from mysound import backend
+from mysound.backend import use, current, Constant, PYTHON, NUMPY, BACKENDS
+from mysound.fileformats.wave import DECODERS, ENCODERS, WAVE_FORMAT_IEEE_FLOAT
+
+class TestBackend(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(use, current().name)
+
+    def test_1(self):
+        """ The pure Python backend is always available
+        """
+        self.assertEqual(use(PYTHON), PYTHON)
+        self.assertIsInstance(current().samples([1.0, 2.0]), array)
+
+    def test_2(self):
+        """ Selecting an unavailable backend falls back to the Python backend
+        """
+        name = use(NUMPY)
+        if backend.numpy is None:
+            self.assertEqual(name, PYTHON)
+        else:
+            self.assertEqual(name, NUMPY)
+
+        self.assertEqual(use("no-such-backend"), PYTHON)
+
+    def test_3(self):
+        """ Constant chunks should behave like the equivalent arrays
+        """
+        chunk = Constant(0.1, 10)
+        expanded = chunk.expand()
+
+        self.assertEqual(len(chunk), 10)
+        self.assertEqual(list(chunk), list(expanded))
+        self.assertEqual(chunk[3], expanded[3])
+        self.assertEqual(chunk[2:5], expanded[2:5])
+        self.assertIsInstance(chunk[2:5], Constant)
+        self.assertRaises(IndexError, lambda : chunk[10])
+
+    def test_4(self):
+        """ Primitives should process constant chunks without expanding them
+        """
+        python = BACKENDS[PYTHON]
+        joined = python.concat([Constant(0.5, 3), Constant(0.5, 4)])
+        self.assertIsInstance(joined, Constant)
+        self.assertEqual(len(joined), 7)
+        self.assertEqual(list(python.concat([Constant(0.5, 2), array('f', [1.0])])), [0.5, 0.5, 1.0])
+
+        mean = python.mean([Constant(0.5, 5), Constant(-0.25, 5)])
+        self.assertIsInstance(mean, Constant)
+        self.assertEqual(list(mean), [0.125]*5)
+
+    def test_5(self):
+        """ Encoding constant chunks should produce the same bytes as the expanded ones
+        """
+        channels = [Constant(0.3, 50), Constant(-1.5, 50)]
+        for key in ENCODERS:
+            encoder = ENCODERS[key][0]
+            self.assertEqual(bytes(encoder(channels)), bytes(encoder([c.expand() for c in channels])), key)
+
+@unittest.skipUnless(backend.numpy, "NumPy is not installed")
+class TestNumpyBackend(unittest.TestCase):
+    def setUp(self):
+        self.python = BACKENDS[PYTHON]
+        self.numpy = BACKENDS[NUMPY]
+        self.previous = current().name
+
+    def test_1(self):
+        """ NumPy decoders should produce the same samples as the Python ones
+        """
+        for key in DECODERS:
+            wFormatTag, nBlockAlign, wBitsPerSample, nChannels = key
+            if wFormatTag == WAVE_FORMAT_IEEE_FLOAT:
+                buffer = array('f', [random.uniform(-1.0, 1.0) for _ in range(500*nChannels)]).tobytes()
+            else:
+                buffer = bytes(random.getrandbits(8) for _ in range(500*nBlockAlign))
+
+            try:
+                use(PYTHON)
+                expected = DECODERS[key](buffer)
+                use(NUMPY)
+                actual = DECODERS[key](buffer)
+            finally:
+                use(self.previous)
+
+            for e, a in zip(expected, actual):
+                self.assertEqual(list(e), a.tolist(), key)
+
+    def test_2(self):
+        """ NumPy encoders should produce the same bytes as the Python ones
+        """
+        channels = [array('f', [random.uniform(-1.2, 1.2) for _ in range(500)]) for _ in range(2)]
+        for key in ENCODERS:
+            encoder = ENCODERS[key][0]
+            try:
+                use(PYTHON)
+                expected = bytes(encoder(channels))
+                use(NUMPY)
+                actual = bytes(encoder([self.numpy.samples(c) for c in channels]))
+            finally:
+                use(self.previous)
+
+            self.assertEqual(actual, expected, key)
+
+    def test_3(self):
+        """ NumPy primitives should match the Python ones
+        """
+        self.assertEqual(self.numpy.ramp(-1.0, 2.0, 3, 10, 20).tolist(), list(self.python.ramp(-1.0, 2.0, 3, 10, 20)))
+        self.assertEqual(self.numpy.constant(0.5, 7).tolist(), list(self.python.constant(0.5, 7)))
+
+        chunk = [[random.uniform(-1.0, 1.0) for _ in range(100)] for _ in range(3)]
+        for e, a in zip(self.python.mean(chunk), self.numpy.mean(chunk)):
+            self.assertAlmostEqual(e, a, places=6)
+
+        gains = ((0.5, 0.0, 0.25), (0.0, 0.0, 0.0))
+        for e, a in zip(self.python.mix(chunk, gains), self.numpy.mix(chunk, gains)):
+            for x, y in zip(e, a):
+                self.assertAlmostEqual(x, y, places=6)
+
+    def test_4(self):
+        """ NumPy encoders should handle constant chunks
+        """
+        channels = [Constant(0.3, 50), Constant(-1.5, 50)]
+        for key in ENCODERS:
+            encoder = ENCODERS[key][0]
+            try:
+                use(PYTHON)
+                expected = bytes(encoder(channels))
+                use(NUMPY)
+                actual = bytes(encoder(channels))
+            finally:
+                use(self.previous)
+
+            self.assertEqual(actual, expected, key)
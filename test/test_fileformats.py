@@ -1,7 +1,20 @@
 import unittest
 
+import os.path
+import tempfile
+
+from array import array
+
+from mysound.context import Context
 from mysound.fileformats import *
-from mysound.fileformats.dummy import Reader
+from mysound.fileformats.dummy import Reader as DummyReader
+from mysound.fileformats.wave import Reader
+from mysound.generator import silence, call
+from mysound.processor import mean, take
+from mysound.actions import pick, skip, truncate
+from mysound.sink import sink
+
+SRC_FILE = os.path.join('.', 'test', 'data', 'ping1000hz.wav')
 
 class TestUtilities(unittest.TestCase):
     def setUp(self):
@@ -10,7 +23,7 @@ class TestUtilities(unittest.TestCase):
           tuple(range(-5, 15)),
         )
 
-        self.file = Reader(self.data)
+        self.file = DummyReader(self.data)
 
     def tearDown(self):
         self.file.close()
@@ -37,3 +50,153 @@ class TestUtilities(unittest.TestCase):
             self.assertSequenceEqual(d1, self.data[0])
             self.assertSequenceEqual(d2, self.data[1])
 
+
+    def test_2(self):
+        """ Skipped channels reaching the end of a file should not close it
+            while other channels still read it
+        """
+        with Reader(SRC_FILE) as wav:
+            total = wav.nDataSamples
+
+        ctx, (left, right) = source(SRC_FILE)
+        expected, cont = take(total, left)
+
+        for offset in (0, 1000, total, 10**9):
+            ctx, (left, right) = source(SRC_FILE)
+            data, cont = take(total, skip(ctx, offset, right))
+            self.assertEqual(len(data), max(total-offset, 0))
+
+            data, cont = take(total, skip(ctx, 1000, left))
+            self.assertEqual(list(data), list(expected[1000:]))
+
+
+    def test_3(self):
+        """ File channels should share a bounded buffer when maxlag is given
+        """
+        ctx, (left, right) = source(SRC_FILE, maxlag=1000)
+        data, left = left(500)
+        data, right = right(500)
+        self.assertLessEqual(left.stats.peak_bytes, 1000*2*4)
+
+        data, left = take(1000, left)
+        self.assertRaises(BufferError, left, 1000)
+
+
+class TestParallelRendering(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def render(self, src, **kwargs):
+        path = os.path.join(self.tmp.name, "{}.wav".format(len(os.listdir(self.tmp.name))))
+        sink(Context(srate=8000), src, path, **kwargs)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_1(self):
+        """ Parallel rendering should produce the same file as serial rendering
+        """
+        def graph():
+            ctx, src = source(SRC_FILE)
+            return [mean(*src), pick(1000, silence(ctx), src[1])]
+
+        self.assertEqual(self.render(graph(), workers=3, segment=5000), self.render(graph()))
+
+    def test_2(self):
+        """ Parallel rendering should fall back to serial rendering for
+            non-idempotent sources
+        """
+        values = iter(range(10000))
+        src = [truncate(None, 10000, call(lambda : next(values)/10000))]
+
+        self.render(src, workers=3, segment=1000)
+        with Reader(os.path.join(self.tmp.name, "0.wav")) as wav:
+            channel, = wav.read(10000)
+        self.assertEqual(list(channel), [float(array('f', [v/10000])[0]) for v in range(10000)])
+
+    def test_3(self):
+        """ Rendering should report its progress
+        """
+        with Reader(SRC_FILE) as wav:
+            total = wav.nDataSamples
+
+        for workers in (None, 3):
+            ctx, src = source(SRC_FILE)
+            reports = []
+            data = self.render(src, workers=workers, segment=5000, progress=lambda done, expected : reports.append((done, expected)))
+            self.assertEqual(reports[-1], (total, total))
+            self.assertEqual([done for done, expected in reports], sorted(done for done, expected in reports))
+
+            # the preallocated space should have been released
+            with Reader(data) as wav:
+                self.assertEqual(wav.nDataSamples, total)
+                self.assertEqual(len(data), wav.dataStart+total*wav.state.nBlockAlign)
+    def test_4(self):
+        """ Parallel rendering should only be used when all channels can skip
+            to the start of a segment without reading the samples before
+        """
+        from mysound.fileformats import _parallelizable
+        from mysound.processor import envelope
+
+        ctx, src = source(SRC_FILE)
+        self.assertTrue(_parallelizable([mean(*src), pick(1000, silence(ctx), src[1])]))
+        self.assertFalse(_parallelizable([envelope(ctx, 1, 10, src[0])]))
+
+        def graph():
+            ctx, src = source(SRC_FILE)
+            return [envelope(ctx, 1, 10, src[0]), src[1]]
+
+        self.assertEqual(self.render(graph(), workers=3, segment=5000), self.render(graph()))
+
+class TestLoad(unittest.TestCase):
+    def test_1(self):
+        """ Loaded channels should hold the same samples as streamed ones
+        """
+        ctx1, src1 = source(SRC_FILE)
+        ctx2, src2 = load(SRC_FILE)
+        with open(SRC_FILE, 'rb') as f:
+            ctx3, src3 = load(f.read())
+
+        self.assertEqual(ctx1, ctx2)
+        self.assertEqual(ctx1, ctx3)
+        for c1, c2, c3 in zip(src1, src2, src3):
+            d1, c1 = take(5000, c1)
+            d2, c2 = take(5000, c2)
+            d3, c3 = take(5000, c3)
+
+            self.assertEqual(list(d1), list(d2))
+            self.assertEqual(list(d1), list(d3))
+
+    def test_2(self):
+        """ Loaded channels should be exhausted at the end of the file
+        """
+        with Reader(SRC_FILE) as wav:
+            length = wav.nDataSamples
+
+        ctx, (channel, _) = load(SRC_FILE)
+        data, channel = take(length, channel)
+        self.assertEqual(len(data), length)
+
+        data, channel = channel(10)
+        self.assertEqual(len(data), 0)
+
+    def test_3(self):
+        """ Loaded channels should not be modifiable through the data they serve
+        """
+        ctx, (channel, _) = load(SRC_FILE)
+        data, _ = channel(5)
+        expected = data[0]
+
+        with self.assertRaises((TypeError, ValueError)):
+            data[0] = 99.0
+
+        data, _ = channel(5)
+        self.assertEqual(data[0], expected)
+
+    def test_4(self):
+        """ Only the readers knowing the length of a file should be registered as loaders
+        """
+        self.assertIn(WAVE_FILE, LOADER)
+        self.assertNotIn("DUMMY", LOADER)
@@ -0,0 +1,60 @@
+import unittest
+
+import math
+import operator
+
+from mysound import fingerprint
+
+def scale(values):
+    return values[0]*2.0
+
+def define(source):
+    namespace = { '__name__': '__main__' }
+    exec(source, namespace)
+    return namespace['f']
+
+class TestFunction(unittest.TestCase):
+    def test_1(self):
+        """ Functions should have a stable key
+        """
+        self.assertIsNotNone(fingerprint.function(scale))
+        self.assertEqual(fingerprint.function(scale), fingerprint.function(scale))
+        self.assertEqual(fingerprint.function(math.sin), fingerprint.function(math.sin))
+        self.assertNotEqual(fingerprint.function(math.sin), fingerprint.function(math.cos))
+        self.assertNotEqual(fingerprint.function(operator.add), fingerprint.function(operator.sub))
+
+    def test_2(self):
+        """ Functions with the same name but different bodies should have different keys
+        """
+        f1 = define("def f(values):\n    return values[0]*2.0\n")
+        f2 = define("def f(values):\n    return values[0]*3.0\n")
+        f3 = define("def f(values):\n    return values[0]*2.0\n")
+        self.assertNotEqual(fingerprint.function(f1), fingerprint.function(f2))
+        self.assertEqual(fingerprint.function(f1), fingerprint.function(f3))
+
+        self.assertNotEqual(fingerprint.function(lambda v : v[0]+1), fingerprint.function(lambda v : v[0]-1))
+
+    def test_3(self):
+        """ The key of a function should depend on its defaults and captured values
+        """
+        def gain(k):
+            return lambda values : values[0]*k
+
+        self.assertEqual(fingerprint.function(gain(2)), fingerprint.function(gain(2)))
+        self.assertNotEqual(fingerprint.function(gain(2)), fingerprint.function(gain(3)))
+
+        f1 = define("def f(values, k=2):\n    return values[0]*k\n")
+        f2 = define("def f(values, k=3):\n    return values[0]*k\n")
+        self.assertNotEqual(fingerprint.function(f1), fingerprint.function(f2))
+
+        f1 = define("K = 2\ndef f(values):\n    return values[0]*K\n")
+        f2 = define("K = 3\ndef f(values):\n    return values[0]*K\n")
+        self.assertNotEqual(fingerprint.function(f1), fingerprint.function(f2))
+
+    def test_4(self):
+        """ Functions depending on mutable values should have no key
+        """
+        state = []
+        self.assertIsNone(fingerprint.function(lambda values : len(state)))
+        self.assertIsNone(fingerprint.function(state.append))
+        self.assertIsNone(fingerprint.function(define("STATE = {}\ndef f(values):\n    return STATE[values[0]]\n")))
@@ -0,0 +1,142 @@
+import unittest
+
+import os.path
+import itertools
+import sys
+
+from mysound import backend, fingerprint, fusion
+from mysound.backend import use, current, Constant, NUMPY, PYTHON
+from mysound.context import Context
+from mysound.fileformats import source
+from mysound.generator import constant, silence, ramp, rawdata, call
+from mysound.multichannel import mux
+from mysound.actions import pick
+from mysound.processor import apply, mean
+
+SRC_FILE = os.path.join('.', 'test', 'data', 'ping1000hz.wav')
+
+def gain(frame):
+    return frame[0]*0.7
+
+def clip(frame):
+    return max(-0.5, min(0.5, sum(frame)))
+
+def readAll(src, sizes):
+    result = []
+    for size in itertools.cycle(sizes):
+        data, src = src(size)
+        if not data:
+            return result
+        result.append(data)
+
+def countCalls(src, size, reads):
+    """ Return the number of Python and builtin function calls made
+        while reading _src_ _reads_ times by chunks of _size_ samples
+    """
+    calls = 0
+    def profile(frame, event, arg):
+        nonlocal calls
+        if event in ('call', 'c_call'):
+            calls += 1
+
+    sys.setprofile(profile)
+    try:
+        for _ in range(reads):
+            data, src = src(size)
+    finally:
+        sys.setprofile(None)
+
+    return calls
+
+class TestFusion(unittest.TestCase):
+    def graph(self):
+        ctx, (left, right) = source(SRC_FILE)
+        r = ramp(ctx, 100000)
+        return mux(
+            mean(pick(1000, silence(ctx), left), apply(gain, right)),
+            apply(clip, mean(left, r, constant(ctx, 0.1)), apply(gain, constant(ctx, 0.3))),
+            mean(constant(ctx, 0.25), apply(gain, silence(ctx))),
+        )
+
+    def test_1(self):
+        """ A compiled graph should produce the same samples as the interpreted one
+        """
+        expected = readAll(self.graph(), (4096,))
+        actual = readAll(fusion.compile(self.graph()), (1, 100, 4096, 10000))
+
+        for n, channel in enumerate(zip(*expected)):
+            expected_channel = [v for chunk in channel for v in chunk]
+            actual_channel = [v for chunk in actual for v in chunk[n]]
+            self.assertEqual(actual_channel, expected_channel)
+
+    def test_2(self):
+        """ Compiling should preserve fingerprints and constant chunks
+        """
+        ctx = Context(srate=44100)
+        src = mean(constant(ctx, 0.25), apply(gain, constant(ctx, 0.5)))
+        compiled = fusion.compile(src)
+
+        self.assertEqual(fingerprint.of(compiled), fingerprint.of(src))
+        data, compiled = compiled(100)
+        self.assertIsInstance(data, Constant)
+        self.assertEqual(data, src(100)[0])
+
+    def test_3(self):
+        """ Opaque sources should be returned unchanged
+        """
+        src = rawdata([1, 2, 3])
+        self.assertIs(fusion.compile(src), src)
+
+    def test_4(self):
+        """ Non-idempotent sources should be read each time they are used
+        """
+        def graph():
+            values = iter(range(1000))
+            src = call(lambda : next(values))
+            return mean(src, src)
+
+        self.assertEqual(list(fusion.compile(graph())(4)[0]), list(graph()(4)[0]))
+
+    @unittest.skipUnless(backend.numpy, "NumPy is not installed")
+    def test_5(self):
+        """ Graphs are not compiled with the NumPy backend
+        """
+        ctx = Context(srate=44100)
+        src = mean(constant(ctx, 0.25), silence(ctx))
+        previous = current().name
+        try:
+            use(NUMPY)
+            self.assertIs(fusion.compile(src), src)
+        finally:
+            use(previous)
+
+    def test_6(self):
+        """ Stages whose inputs are constant over a block should be computed once per block
+        """
+        ctx = Context(srate=44100)
+        calls = []
+        def f(frame):
+            calls.append(frame)
+            return frame[0]*2
+
+        src = fusion.compile(mean(ramp(ctx, 1000), apply(f, constant(ctx, 0.25))))
+        data, src = src(100)
+        data, src = src(100)
+        self.assertEqual(calls, [(0.25,), (0.25,)])
+
+    def test_7(self):
+        """ With small chunks, a compiled graph should do less work than the interpreted one
+        """
+        if current().name != PYTHON:
+            self.skipTest("Graphs are only compiled with the Python backend")
+
+        def graph():
+            ctx, (left, right) = source(SRC_FILE)
+            x = pick(1000, silence(ctx), left)
+            for _ in range(4):
+                x = mean(apply(gain, x), right)
+            return x
+
+        interpreted = countCalls(graph(), 64, 100)
+        compiled = countCalls(fusion.compile(graph()), 64, 100)
+        self.assertLess(compiled, interpreted/2)
@@ -1,9 +1,12 @@
 import unittest
 
+import math
+
 from pprint import pprint
 
 from mysound.generator import *
 from mysound.context import Context
+from mysound.backend import current
 
 SRATE=44100
 CONTEXT = Context(srate=SRATE)
@@ -15,7 +18,7 @@ class TestGenerator(unittest.TestCase):
         K=123.456
         s = sample(K)
 
-        self.assertIsInstance(s, array)
+        self.assertIsInstance(s, type(current().samples()))
         self.assertEqual(len(s), 1)
         self.assertAlmostEqual(s[0], 123.456, places=4)
 
@@ -30,7 +33,7 @@ class TestGenerator(unittest.TestCase):
             samples, g = g(N)
 
             self.assertTrue(0 < len(samples) <= N)
-            self.assertSequenceEqual(samples,sample(K)*N)
+            self.assertSequenceEqual(list(samples), list(sample(*[K]*N)))
 
     def test_2(self):
         """ Generators should share their context with the next generation
@@ -52,11 +55,11 @@ class TestGenerator(unittest.TestCase):
         g = ramp(Context(srate=3))
         samples, g = g(N)
 
-        self.assertEqual(samples, sample(-1,0,+1))
+        self.assertEqual(list(samples), list(sample(-1,0,+1)))
 
         for i in range(10):
             samples, g = g(N)
-            self.assertEqual(samples, sample())
+            self.assertEqual(len(samples), 0)
 
     def test_4(self):
         """ The _call_ generator should produce data from an external source
@@ -74,3 +77,58 @@ class TestGenerator(unittest.TestCase):
             result.extend(data)
 
         self.assertEqual(result, [float(v) for v in range(1,11)])
+
+    def test_5(self):
+        """ Oscillators should produce their waveform at the given frequency
+        """
+        ctx = Context(srate=8000)
+        data, g = sine(ctx, 1000)(16)
+        for k, v in enumerate(data):
+            self.assertAlmostEqual(v, math.sin(2*math.pi*k/8), places=5)
+
+        data, g = square(ctx, 1000)(8)
+        self.assertEqual(list(data), [1.0]*4 + [-1.0]*4)
+
+        data, g = triangle(ctx, 1000)(8)
+        self.assertEqual(list(data), [0.0, 0.5, 1.0, 0.5, 0.0, -0.5, -1.0, -0.5])
+
+        data, g = saw(ctx, 1000)(8)
+        self.assertEqual(list(data), [0.0, 0.25, 0.5, 0.75, -1.0, -0.75, -0.5, -0.25])
+
+    def test_6(self):
+        """ Oscillators should not depend on the chunk sizes
+        """
+        ctx = Context(srate=44100)
+        expected, g = sine(ctx, 440.5, 0.5, 0.25)(1000)
+
+        g = sine(ctx, 440.5, 0.5, 0.25)
+        result = []
+        for n in (1, 7, 100, 892):
+            data, g = g(n)
+            result.extend(data)
+
+        self.assertEqual(result, list(expected))
+
+    def test_7(self):
+        """ An oscillator bank should produce the sum of its partials
+        """
+        ctx = Context(srate=44100)
+        partials = ((100, 0.5), (250, 0.25, 0.5), (1000, 0.125))
+
+        data, g = bank(ctx, partials)(500)
+        expected = [0.0]*500
+        for p in partials:
+            d, _ = sine(ctx, *p)(500)
+            expected = [a+b for a, b in zip(expected, d)]
+
+        for a, b in zip(data, expected):
+            self.assertAlmostEqual(a, b, places=5)
+
+    def test_8(self):
+        """ Oscillators should accept negative frequencies and phases
+        """
+        ctx = Context(srate=44100)
+        for frequency, phase in ((-25.0, -1e-17), (-25.0, 0.3), (-1000.0, 0.0), (25.0, -1e-17)):
+            data, g = sine(ctx, frequency, phase=phase)(5000)
+            self.assertEqual(len(data), 5000)
+            self.assertAlmostEqual(data[100], math.sin(2*math.pi*(frequency*100/44100+phase)), places=5)
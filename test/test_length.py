@@ -0,0 +1,78 @@
+import unittest
+
+import os.path
+
+from mysound import length
+from mysound.context import Context
+from mysound.fileformats import source
+from mysound.fileformats.wave import Reader
+from mysound.generator import rawdata, ramp, silence, sine
+from mysound.multichannel import mux, demux
+from mysound.actions import pick, truncate, skip
+from mysound.processor import mean, apply, resample, convolve
+
+SRC_FILE = os.path.join('.', 'test', 'data', 'ping1000hz.wav')
+
+class TestLength(unittest.TestCase):
+    def test_1(self):
+        """ Generators should expose their length
+        """
+        ctx = Context(srate=100)
+        self.assertEqual(length.of(rawdata([1, 2, 3])), 3)
+        self.assertEqual(length.of(ramp(ctx, 50)), 50)
+        self.assertEqual(length.of(silence(ctx)), length.INFINITE)
+        self.assertEqual(length.of(sine(ctx, 10)), length.INFINITE)
+
+        data, cont = rawdata([1, 2, 3])(2)
+        self.assertEqual(length.of(cont), 1)
+
+    def test_2(self):
+        """ Length hints should propagate through mux, demux and pick
+        """
+        ctx = Context(srate=100)
+        src = mux(rawdata(range(10)), pick(4, silence(ctx), rawdata(range(3))))
+        self.assertEqual(length.of(src), 7)
+
+        data, src = src(3)
+        self.assertEqual(length.of(src), 4)
+
+        left, right = demux(2, src)
+        self.assertEqual(length.of(left), 4)
+        data, left = left(1)
+        self.assertEqual(length.of(left), 3)
+
+    def test_3(self):
+        """ File sources should expose their length
+        """
+        with Reader(SRC_FILE) as wav:
+            expected = wav.nDataSamples
+
+        ctx, (left, right) = source(SRC_FILE)
+        self.assertEqual(length.of(left), expected)
+        data, left = left(1000)
+        self.assertEqual(length.of(left), expected-1000)
+
+    def test_4(self):
+        """ Processors should compute their length from their inputs
+        """
+        ctx = Context(srate=8000)
+        a = rawdata(range(10))
+        b = truncate(ctx, 6, silence(ctx))
+        self.assertEqual(length.of(mean(a, b)), 6)
+        self.assertEqual(length.of(apply(sum, a, silence(ctx))), 10)
+        self.assertEqual(length.of(skip(ctx, 3, a)), 7)
+        self.assertEqual(length.of(convolve([1, 1, 1], a)), 12)
+        self.assertEqual(length.of(resample(ctx, 12000, a)[1]), 15)
+        self.assertIsNone(length.of(mean(a, lambda n : ([], None))))
+
+    def test_5(self):
+        """ pick should end with its first source if it stops before the switch
+        """
+        src = pick(10, rawdata([1, 2, 3]), rawdata([9]*5))
+        self.assertEqual(length.of(src), 3)
+
+        data, src = src(100)
+        self.assertEqual(len(data), 3)
+        self.assertEqual(len(src(100)[0]), 0)
+
+        self.assertEqual(length.of(pick(3, rawdata([1, 2, 3]), rawdata([9]*5))), 8)
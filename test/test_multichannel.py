@@ -2,6 +2,7 @@ import unittest
 
 from mysound.context import Context
 from mysound.multichannel import *
+import mysound.generator as generator
 from mysound.generator import constant
 from mysound.actions import pick
 
@@ -51,14 +52,14 @@ class TestTrack(unittest.TestCase):
             while True:
                 v, ch1 = ch1(3)
                 # print(v)
-                if not v:
+                if not len(v):
                     break
 
                 d1.extend(v)
             while True:
                 v, ch2 = ch2(3)
                 # print(v)
-                if not v:
+                if not len(v):
                     break
 
                 d2.extend(v)
@@ -67,3 +68,60 @@ class TestTrack(unittest.TestCase):
             self.assertSequenceEqual(d2, data[1])
 
 
+    def test_3(self):
+        """ In fill mode, the muxer should return the requested number of
+            samples across the segment boundaries of its inputs
+        """
+        data = [float(v) for v in range(50)]
+        ctx = Context(srate=44100)
+        t = mux(
+            generator.rawdata(data),
+            pick(3, constant(ctx, 0.5), generator.rawdata(data)),
+            fill=True
+        )
+
+        sizes = []
+        r0 = []
+        r1 = []
+        while True:
+            chunk, t = t(9)
+            if chunk is None:
+                break
+            sizes.append(len(chunk[0]))
+            r0.extend(chunk[0])
+            r1.extend(chunk[1])
+
+        self.assertEqual(sizes, [9]*5 + [5])
+        self.assertEqual(r0, data)
+        self.assertEqual(r1, [0.5]*3 + data[:47])
+
+    def test_4(self):
+        """ A bounded demuxer should release consumed data and
+            refuse to let a channel run too far ahead
+        """
+        data = (
+          tuple(range(-100, 100)),
+          tuple(range(-50, 150)),
+        )
+
+        ch1, ch2 = demux(2, rawdata(*data), maxlag=32)
+        d1 = []
+        d2 = []
+        while True:
+            v1, ch1 = ch1(10)
+            v2, ch2 = ch2(10)
+            if not len(v1):
+                break
+            d1.extend(v1)
+            d2.extend(v2)
+
+        self.assertSequenceEqual(d1, data[0])
+        self.assertSequenceEqual(d2, data[1])
+        self.assertLessEqual(ch1.stats.peak_bytes, 32*2*4)
+
+        ch1, ch2 = demux(2, rawdata(*data), maxlag=32)
+        with self.assertRaises(BufferError):
+            while True:
+                v1, ch1 = ch1(10)
+                if not len(v1):
+                    break
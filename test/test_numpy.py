@@ -0,0 +1,34 @@
+""" Run the test cases of the other modules with the NumPy backend
+"""
+import unittest
+
+from mysound import backend
+from mysound.backend import use, current, NUMPY
+
+from test import test_actions, test_aio, test_context, test_dummy, test_fileformats, test_fingerprint
+from test import test_fusion, test_generator, test_length, test_multichannel, test_processor
+from test import test_rendercache, test_time, test_wave
+
+MODULES = (
+    test_actions, test_aio, test_context, test_dummy, test_fileformats, test_fingerprint,
+    test_fusion, test_generator, test_length, test_multichannel, test_processor,
+    test_rendercache, test_time, test_wave,
+)
+
+class NumpyBackend:
+    """ Mixin selecting the NumPy backend while running the tests of a test case
+    """
+    def setUp(self):
+        self.addCleanup(use, current().name)
+        use(NUMPY)
+        super().setUp()
+
+for module in MODULES:
+    for name, case in list(vars(module).items()):
+        if isinstance(case, type) and issubclass(case, unittest.TestCase) and case.__module__ == module.__name__:
+            name = "Numpy_{}_{}".format(module.__name__.split('.')[-1], name)
+            globals()[name] = unittest.skipUnless(backend.numpy, "NumPy is not installed")(
+                type(name, (NumpyBackend, case), {})
+            )
+
+del module, name, case
@@ -1,10 +1,18 @@
 import unittest
 
 from mysound.context import Context
-from mysound.generator import ramp, sample, constant
+from mysound.backend import Constant, current
+from mysound.generator import ramp, sample, constant, silence
+from mysound.processor import apply, applyBlock, convolve, matrix, mean, resample
+from mysound.processor import envelope, rms, slidingMax, slidingMin, stft, materialize, take
+from mysound.processor import _window, HANN
+from mysound.fileformats import source
+from mysound.multichannel import mux, demux
 from mysound.actions import loop, pick
+from mysound import generator
 from mysound.time import seconds
 
+import math
 import random
 
 class ProcessorTest(unittest.TestCase):
@@ -18,4 +26,312 @@ class ProcessorTest(unittest.TestCase):
         for i in range(20):
             samples, l = l(random.randint(3,10))
 
-            self.assertEqual(samples, sample(-1,0,1))
+            self.assertEqual(list(samples), [-1, 0, 1])
+
+    def test_2(self):
+        """ Processors should compute constant chunks once per chunk
+        """
+        ctx = Context(srate=44100)
+        calls = []
+        def fct(values):
+            calls.append(values)
+            return sum(values)
+
+        src = apply(fct, constant(ctx, 0.5), silence(ctx), constant(ctx, 0.25))
+        data, src = src(1000)
+        self.assertIsInstance(data, Constant)
+        self.assertEqual(list(data), [0.75]*1000)
+        self.assertEqual(calls, [(0.5, 0.0, 0.25)])
+
+        data, src = mean(constant(ctx, 0.5), silence(ctx))(1000)
+        self.assertIsInstance(data, Constant)
+        self.assertEqual(list(data), [0.25]*1000)
+
+    def test_3(self):
+        """ Constant chunks should be expanded when mixed with other data
+        """
+        ctx = Context(srate=3)
+        data, src = mean(pick(2, silence(ctx), constant(ctx, 1.0)), loop(ramp(ctx, seconds(1))))(3)
+        self.assertEqual(list(data), [-0.5, 0.0, 1.0])
+
+    def test_4(self):
+        """ The block variant of apply should call its function once per chunk
+        """
+        ctx = Context(srate=44100)
+        calls = []
+        def gain(left, right):
+            self.assertIsNot(type(right), Constant)
+            calls.append(len(left))
+            return [2*a+b for a, b in zip(left, right)]
+
+        src = applyBlock(gain, generator.rawdata(range(10)), constant(ctx, 0.5))
+        data, src = src(6)
+        self.assertEqual(list(data), [0.5, 2.5, 4.5, 6.5, 8.5, 10.5])
+        data, src = src(6)
+        self.assertEqual(list(data), [12.5, 14.5, 16.5, 18.5])
+        data, src = src(6)
+        self.assertEqual(len(data), 0)
+        self.assertEqual(calls, [6, 4])
+
+    def test_5(self):
+        """ The block variant of apply can produce several channels
+        """
+        def minmax(channel):
+            return [min(x, 0) for x in channel], [max(x, 0) for x in channel]
+
+        low, high = applyBlock(minmax, generator.rawdata([-1, 2, -3, 4]), outputs=2)
+        data, low = low(10)
+        self.assertEqual(list(data), [-1, 0, -3, 0])
+        data, high = high(10)
+        self.assertEqual(list(data), [0, 2, 0, 4])
+
+    def test_6(self):
+        """ The matrix mixer should produce the weighted sums of its inputs
+        """
+        ctx = Context(srate=44100)
+        channels = (generator.rawdata([1, 2, 3]), generator.rawdata([10, 20, 30]), constant(ctx, 100))
+        gains = ((1, 0, 0.5), (0, 0, 0), (0.5, 0.25, 0))
+
+        for precise in (False, True):
+            outputs = matrix(gains, *channels, precise=precise)
+            self.assertEqual(len(outputs), 3)
+
+            result = []
+            for output in outputs:
+                data, output = output(10)
+                result.append(list(data))
+
+            self.assertEqual(result, [[51, 52, 53], [0, 0, 0], [3, 6, 9]])
+
+    def test_7(self):
+        """ The precise mode of the matrix mixer should not lose small contributions
+        """
+        ctx = Context(srate=44100)
+        channels = (constant(ctx, 1.0), generator.rawdata([1e-8]*4), constant(ctx, -1.0))
+
+        left, = matrix(((1, 1, 1),), *channels, precise=True)
+        data, left = left(10)
+        self.assertEqual(list(data), list(sample(*[1e-8]*4)))
+
+        self.assertRaises(TypeError, matrix, ((1, 1),), *channels)
+
+    def test_8(self):
+        """ The convolution processor should match the direct convolution
+        """
+        x = [random.uniform(-1.0, 1.0) for _ in range(300)]
+        h = [random.uniform(-1.0, 1.0) for _ in range(70)]
+        expected = [sum(x[i-j]*h[j] for j in range(len(h)) if 0 <= i-j < len(x)) for i in range(len(x)+len(h)-1)]
+
+        for partition in (None, 16, 128):
+            src = convolve(h, generator.rawdata(x), partition)
+            result = []
+            while True:
+                data, src = src(random.randint(1, 50))
+                if not len(data):
+                    break
+                result.extend(data)
+
+            self.assertEqual(len(result), len(expected))
+            for a, b in zip(result, expected):
+                self.assertAlmostEqual(a, b, places=4)
+
+    def test_9(self):
+        """ Convolving silence should produce silence
+        """
+        ctx = Context(srate=44100)
+        src = convolve([0.5, 0.25], pick(3, generator.rawdata([1, 1, 1]), silence(ctx)), 2)
+        data, src = src(8)
+        result = list(data)
+        while len(result) < 8:
+            data, src = src(8-len(result))
+            result.extend(data)
+
+        self.assertEqual(result, [0.5, 0.75, 0.75, 0.25, 0, 0, 0, 0])
+
+    def test_10(self):
+        """ The resampler should preserve the signal and produce the expected number of samples
+        """
+        for irate, orate in ((8000, 12000), (12000, 8000), (44100, 48000)):
+            ctx = Context(srate=irate)
+            x = [math.sin(2*math.pi*440*i/irate) for i in range(2000)]
+            newctx, src = resample(ctx, orate, generator.rawdata(x))
+            self.assertEqual(newctx.srate, orate)
+
+            result = []
+            while True:
+                data, src = src(random.randint(1, 500))
+                if not len(data):
+                    break
+                result.extend(data)
+
+            self.assertEqual(len(result), math.ceil(2000*orate/irate))
+            for j in range(100, len(result)-100):
+                self.assertAlmostEqual(result[j], math.sin(2*math.pi*440*j/orate), places=2)
+
+    def test_11(self):
+        """ Resampling to the same rate should return the source unchanged
+        """
+        ctx = Context(srate=8000)
+        src = generator.rawdata([1, 2, 3])
+        self.assertEqual(resample(ctx, 8000, src), (ctx, src))
+
+    def _readAll(self, src):
+        result = []
+        while True:
+            data, src = src(random.randint(1, 20))
+            if not len(data):
+                return result
+            result.extend(data)
+
+    def test_12(self):
+        """ Sliding statistics should match their direct computation across chunk boundaries
+        """
+        ctx = Context(srate=100)
+        x = [random.uniform(-1.0, 1.0) for _ in range(200)]
+        w = 7
+
+        # Read the input through mux/demux so chunks are split at various places
+        left, right = demux(2, mux(generator.rawdata(x), generator.rawdata(x)))
+
+        padded = [0.0]*w + x
+        expected = [math.sqrt(sum(v*v for v in padded[i+1:i+w+1])/w) for i in range(len(x))]
+        for a, b in zip(self._readAll(rms(ctx, w, left)), expected):
+            self.assertAlmostEqual(a, b, places=5)
+
+        expected = [max(x[max(0, i-w+1):i+1]) for i in range(len(x))]
+        self.assertEqual(self._readAll(slidingMax(ctx, w, right)), list(sample(*expected)))
+
+        expected = [min(x[max(0, i-w+1):i+1]) for i in range(len(x))]
+        self.assertEqual(self._readAll(slidingMin(ctx, w, generator.rawdata(x))), list(sample(*expected)))
+
+    def test_13(self):
+        """ The envelope follower should rise with the attack and decay with the release
+        """
+        ctx = Context(srate=100)
+        x = [1.0]*50 + [0.0]*50
+        result = self._readAll(envelope(ctx, 1, 10, generator.rawdata(x)))
+        self.assertEqual(len(result), 100)
+        self.assertAlmostEqual(result[49], 1.0, places=5)
+        self.assertAlmostEqual(result[59], math.exp(-1.0), places=5)
+        self.assertTrue(all(a >= b for a, b in zip(result[49:], result[50:])))
+
+    def test_14(self):
+        """ The STFT should locate a sine wave in the expected bin
+        """
+        ctx = Context(srate=1024)
+        x = [math.sin(2*math.pi*64*i/1024) for i in range(1024)]
+
+        frames = []
+        src = stft(generator.rawdata(x), 256, 64)
+        while True:
+            data, src = src(random.randint(1, 4))
+            if not data:
+                break
+            frames.extend(data)
+
+        self.assertEqual(len(frames), (1024-256)//64+1)
+        for frame in frames:
+            self.assertEqual(len(frame), 129)
+            self.assertEqual(max(range(len(frame)), key=frame.__getitem__), 16)
+            self.assertAlmostEqual(frame[16], 64.0, places=3)
+
+    def test_15(self):
+        """ The STFT should be able to return the complex bins of frames read from a file
+        """
+        ctx, (src, *_) = source("test/data/ping1000hz.wav")
+        frames, src = stft(src, 512, nfft=1024, window="rectangular", magnitude=False)(2)
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(len(frames[0]), 513)
+
+        data, _ = source("test/data/ping1000hz.wav")[1][0](768)
+        self.assertAlmostEqual(frames[1][0].real, math.fsum(data[256:768]), places=3)
+
+    def test_16(self):
+        """ materialize should read a whole source, with or without a length hint
+        """
+        ctx = Context(srate=100)
+        data, cont = materialize(generator.rawdata(range(25000)))
+        self.assertEqual(list(data), list(range(25000)))
+
+        hintless = generator.rawdata(range(25000))
+        unhinted = lambda n, src=hintless : (lambda d : (d[0], d[1]))(src(n))
+        data, cont = materialize(apply(sum, unhinted))
+        self.assertEqual(list(data), list(range(25000)))
+
+        self.assertRaises(ValueError, materialize, silence(ctx))
+
+    def test_17(self):
+        """ take should stop at the end of an exhausted source
+        """
+        ctx = Context(srate=100)
+        data, cont = take(10, generator.rawdata([1, 2, 3]))
+        self.assertEqual(list(data), [1, 2, 3])
+
+        data, cont = take(5, pick(2, constant(ctx, 1.0), silence(ctx)))
+        self.assertEqual(list(data), [1, 1, 0, 0, 0])
+
+    def test_18(self):
+        """ Sliding statistics continuations should be readable several times
+        """
+        ctx = Context(srate=100)
+        x = [random.uniform(-1.0, 1.0) for _ in range(100)]
+        w = 30
+
+        for statistic in (rms, slidingMax, slidingMin):
+            expected = self._readAll(statistic(ctx, w, generator.rawdata(x)))
+
+            src = statistic(ctx, w, generator.rawdata(x))
+            head, cont = src(45)
+            again, _ = src(45)
+            self.assertEqual(list(head), list(again))
+            self.assertEqual(list(head)+self._readAll(cont), expected)
+            self.assertEqual(list(head)+self._readAll(cont), expected)
+
+    def test_19(self):
+        """ The STFT frames should not depend on the number of frames read at once,
+            even when the hop is larger than the frame size
+        """
+        x = [0.0]*30
+        x[10] = 1.0
+
+        def frames(src, count):
+            result = []
+            while True:
+                data, src = src(count)
+                if not data:
+                    return result
+                result.extend(list(frame) for frame in data)
+
+        one = frames(stft(generator.rawdata(x), 4, 10, window="rectangular"), 1)
+        two = frames(stft(generator.rawdata(x), 4, 10, window="rectangular"), 2)
+        self.assertEqual(len(one), 3)
+        self.assertEqual(one, two)
+        self.assertEqual([frame[0] for frame in one], [0.0, 1.0, 0.0])
+
+    def test_20(self):
+        """ Skipping element-wise processors should skip their inputs
+        """
+        ctx = Context(srate=100)
+        x = [float(v) for v in range(100)]
+        graphs = (
+            lambda : apply(sum, generator.rawdata(x), ramp(ctx, 100)),
+            lambda : applyBlock(lambda a, b : [u-v for u, v in zip(a, b)], generator.rawdata(x), constant(ctx, 1.0)),
+            lambda : mean(generator.rawdata(x), pick(30, silence(ctx), generator.rawdata(x))),
+            lambda : matrix([[1.0, 2.0]], generator.rawdata(x), generator.rawdata(x))[0],
+        )
+
+        for graph in graphs:
+            src = graph()
+            self.assertTrue(hasattr(src, 'skip'))
+            expected, _ = take(100, graph())
+            for k in (0, 10, 30, 45, 100):
+                data, _ = take(100, src.skip(k))
+                self.assertEqual(list(data), list(expected[k:]))
+
+    def test_21(self):
+        """ Analysis windows should be computed once, as arrays of the current backend
+        """
+        window = _window(HANN, 64)
+        self.assertIs(_window(HANN, 64), window)
+        self.assertIs(type(window), type(current().window([])))
+        self.assertEqual(len(window), 64)
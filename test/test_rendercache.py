@@ -0,0 +1,79 @@
+import unittest
+
+import gc
+import os.path
+import tempfile
+
+from mysound.context import Context
+from mysound.generator import constant, ramp, call
+from mysound.processor import mean, take
+from mysound.actions import pick, truncate, skip
+from mysound.fileformats import source, _parallelizable
+from mysound.sink import sink
+from mysound.fingerprint import of
+from mysound.rendercache import cached, path
+
+SRC_FILE = os.path.join('.', 'test', 'data', 'pcm_int16_2.wav')
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ctx = Context(srate=100)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def graph(self, k=0.5):
+        ctx = self.ctx
+        return mean(truncate(ctx, 500, ramp(ctx, 1000)), pick(100, constant(ctx, k), ramp(ctx, 1000)))
+
+    def test_1(self):
+        """ Identical graphs should have the same fingerprint
+        """
+        self.assertIsNotNone(of(self.graph()))
+        self.assertEqual(of(self.graph()), of(self.graph()))
+        self.assertNotEqual(of(self.graph(0.5)), of(self.graph(0.25)))
+        self.assertIsNone(of(mean(call(lambda : 0.0), self.graph())))
+
+        ctx, src1 = source(SRC_FILE)
+        ctx, src2 = source(SRC_FILE)
+        self.assertEqual(of(src1[0]), of(src2[0]))
+        self.assertNotEqual(of(src1[0]), of(src1[1]))
+
+    def test_2(self):
+        """ Rendered channels should be stored and read back from the cache
+        """
+        expected, cont = take(500, self.graph())
+
+        rendered, cont = take(500, cached(self.graph(), self.tmp.name))
+        data, cont = cont(10)
+        self.assertEqual(len(data), 0)
+        self.assertEqual(list(rendered), list(expected))
+        self.assertTrue(os.path.exists(path(self.tmp.name, self.graph())))
+
+        channel = cached(self.graph(), self.tmp.name)
+        reloaded, cont = take(500, channel)
+        self.assertEqual(list(reloaded), list(expected))
+        self.assertEqual(os.listdir(self.tmp.name), [os.path.basename(path(self.tmp.name, self.graph()))])
+
+    def test_3(self):
+        """ Cached channels should still be rendered in parallel
+        """
+        ctx, src = source(SRC_FILE)
+        channels = [cached(channel, self.tmp.name) for channel in src]
+        self.assertTrue(_parallelizable(channels))
+
+        expected, cont = take(500, skip(ctx, 1000, src[0]))
+        data, cont = take(500, skip(ctx, 1000, channels[0]))
+        self.assertEqual(list(data), list(expected))
+
+        output = os.path.join(self.tmp.name, "parallel.wav")
+        sink(ctx, source(SRC_FILE)[1], output, cache=self.tmp.name, workers=2, segment=3000)
+        ctx, rendered = source(output)
+        for a, b in zip(rendered, src):
+            self.assertEqual(list(take(20000, a)[0]), list(take(20000, b)[0]))
+
+        # nothing is recorded, and partial entries are discarded
+        del channels, data, cont
+        gc.collect()
+        self.assertEqual(os.listdir(self.tmp.name), ["parallel.wav"])
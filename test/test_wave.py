@@ -1,8 +1,16 @@
 import unittest
 
+import io
 import os.path
+import random
+import struct
+import sys
+
+from array import array
 
 from mysound.fileformats.wave import Reader, Writer, WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT
+from mysound.fileformats import wave
+from mysound.fileformats.wave import DECODERS, StreamWriter
 
 WAVEFILES = [os.path.join('.', 'test', 'data', fname) for fname in (
     'ieee_float32_1.wav',
@@ -31,6 +39,77 @@ class TestWaveReader(unittest.TestCase):
                         break
 
 
+def channels(data):
+    """ Return the samples of multichannel data as lists, whatever the backend
+    """
+    return [list(c) for c in data]
+
+def reference_decoder(wFormatTag, nBlockAlign, wBitsPerSample, nChannels):
+    """ Sample-by-sample decoder used as a reference implementation
+    """
+    width = wBitsPerSample//8
+    def decode(buffer):
+        channels = [array('f') for _ in range(nChannels)]
+        for n in range(0, len(buffer), nBlockAlign):
+            for c in channels:
+                raw = buffer[n:n+width]
+                if wFormatTag == WAVE_FORMAT_IEEE_FLOAT:
+                    c.append(struct.unpack('<f', raw)[0])
+                elif width == 1:
+                    c.append((int.from_bytes(raw, 'little')-128)/128)
+                else:
+                    c.append(int.from_bytes(raw, 'little', signed=True)/(1<<wBitsPerSample-1))
+                n += width
+
+        return channels
+
+    return decode
+
+def random_buffer(wFormatTag, nBlockAlign, nFrames):
+    if wFormatTag == WAVE_FORMAT_IEEE_FLOAT:
+        return array('f', [random.uniform(-1.0, 1.0) for _ in range(nFrames*nBlockAlign//4)]).tobytes()
+
+    return bytes(random.getrandbits(8) for _ in range(nFrames*nBlockAlign))
+
+def count_calls(fct, *args):
+    """ Return the number of Python and builtin function calls made by
+        `fct(*args)`
+    """
+    calls = 0
+    def profile(frame, event, arg):
+        nonlocal calls
+        if event in ('call', 'c_call'):
+            calls += 1
+
+    sys.setprofile(profile)
+    try:
+        fct(*args)
+    finally:
+        sys.setprofile(None)
+
+    return calls
+
+class TestWaveDecoders(unittest.TestCase):
+    def test_1(self):
+        """ Bulk decoders should produce the same samples as the
+            sample-by-sample reference implementation
+        """
+        for key, decoder in DECODERS.items():
+            buffer = random_buffer(key[0], key[1], 1000)
+            expected = reference_decoder(*key)(buffer)
+
+            self.assertEqual(channels(decoder(buffer)), channels(expected), key)
+            self.assertEqual(channels(decoder(memoryview(buffer))), channels(expected), key)
+
+    def test_2(self):
+        """ Bulk decoders should not make a function call per sample
+        """
+        for key, decoder in DECODERS.items():
+            small = count_calls(decoder, random_buffer(key[0], key[1], 1000))
+            large = count_calls(decoder, random_buffer(key[0], key[1], 20000))
+
+            self.assertEqual(small, large, key)
+
 class TestWaveWriter(unittest.TestCase):
     def test_1(self):
         """ WaveReader can read valid wave files
@@ -46,3 +125,167 @@ class TestWaveWriter(unittest.TestCase):
                 fname = TMP_FILE.format('float', nBits, nChannels)
                 with Writer(48000, nBits, nChannels, fname, format=WAVE_FORMAT_IEEE_FLOAT) as wav:
                     wav.write(samples*nChannels)
+
+    def test_2(self):
+        """ Written samples should be read back unchanged, and each
+            block should be written in one call
+        """
+        samples = [ [-1.0, -0.5, 0.0, 0.25, 0.5, 0.75]*1000, [0.5, 0.0, -0.25, -0.5, -0.75, -1.0]*1000 ]
+        for format, nBits in ((WAVE_FORMAT_PCM, 8), (WAVE_FORMAT_PCM, 16), (WAVE_FORMAT_PCM, 24),
+                              (WAVE_FORMAT_PCM, 32), (WAVE_FORMAT_IEEE_FLOAT, 32)):
+            fname = TMP_FILE.format('roundtrip', nBits, format)
+            with Writer(48000, nBits, 2, fname, format=format) as wav:
+                writes = []
+                write = wav.stream.write
+                wav.stream.write = lambda data: writes.append(data) or write(data)
+                wav.write(samples)
+                wav.write(samples)
+                self.assertEqual(len(writes), 2)
+
+            with Reader(fname) as wav:
+                left, right = wav.read(20000)
+
+            self.assertEqual(list(left), samples[0]*2)
+            self.assertEqual(list(right), samples[1]*2)
+
+    def test_3(self):
+        """ Writers should leave the file objects they are given open
+        """
+        f = io.BytesIO()
+        with Writer(48000, 16, 1, f, format=WAVE_FORMAT_PCM) as wav:
+            wav.write([[0.0, 0.5, -0.5]])
+
+        self.assertFalse(f.closed)
+        with Reader(f.getvalue()) as wav:
+            self.assertEqual(list(wav.read(10)[0]), [0.0, 0.5, -0.5])
+
+class TestWaveMappedReader(unittest.TestCase):
+    def test_1(self):
+        """ Memory-mapped readers should decode the same samples as stream readers
+        """
+        for f in WAVEFILES:
+            with Reader(f) as wav:
+                expected = wav.read(1<<20)
+            with Reader(f, mmap=True) as wav:
+                self.assertEqual(len(wav.data), wav.dataLength*wav.state.nBlockAlign)
+                self.assertEqual(channels(wav.read(1<<20)), channels(expected))
+                self.assertIsNone(wav.read(1))
+
+    def test_2(self):
+        """ Readers should support random access by sample offset
+        """
+        for mmap in (False, True):
+            for f in WAVEFILES:
+                with Reader(f, mmap=mmap) as wav:
+                    expected = wav.read(1<<20)
+                    for offset in (0, 17, 1000, wav.dataLength-5):
+                        wav.seek(offset)
+                        self.assertEqual(wav.tell(), offset)
+                        chunk = wav.read(10)
+                        self.assertEqual(channels(chunk), [list(c[offset:offset+10]) for c in expected])
+
+class Pipe:
+    """ A non-seekable output
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+
+    def flush(self):
+        pass
+
+    def seekable(self):
+        return False
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+class TestWaveStreamWriter(unittest.TestCase):
+    def test_1(self):
+        """ When the length is known, streamed Wav data should be the same
+            as a file written by Writer
+        """
+        samples = [ [-1.0]*4020 + [0.0]*8040 + [1.0]*4020 ]*2
+        for format, nBits in ((WAVE_FORMAT_PCM, 16), (WAVE_FORMAT_PCM, 24), (WAVE_FORMAT_IEEE_FLOAT, 32)):
+            fname = TMP_FILE.format('stream', nBits, format)
+            with Writer(48000, nBits, 2, fname, format=format) as wav:
+                wav.write(samples)
+
+            pipe = Pipe()
+            with StreamWriter(48000, nBits, 2, pipe, format=format, nFrames=len(samples[0])) as wav:
+                wav.write([s[:5000] for s in samples])
+                wav.write([s[5000:] for s in samples])
+
+            with open(fname, 'rb') as f:
+                self.assertEqual(pipe.getvalue(), f.read())
+
+    def test_2(self):
+        """ When the length is unknown, streamed Wav data should be readable
+        """
+        samples = [ [0.5]*1000, [-0.5]*1000 ]
+        pipe = Pipe()
+        with StreamWriter(48000, 32, 2, pipe) as wav:
+            wav.write(samples)
+
+        fname = TMP_FILE.format('stream', 'unknown', 2)
+        with open(fname, 'wb') as f:
+            f.write(pipe.getvalue())
+
+        with Reader(fname) as wav:
+            left, right = wav.read(1<<20)
+            self.assertIsNone(wav.read(1))
+
+        self.assertEqual(list(left), samples[0])
+        self.assertEqual(list(right), samples[1])
+
+    def test_3(self):
+        """ The fact chunk should hold the number of samples per channel,
+            or the "unknown" value when the length is unknown
+        """
+        def fact(header):
+            offset = header.index(b'fact')+8
+            return int.from_bytes(header[offset:offset+4], 'little')
+
+        for nChannels in (1, 2):
+            self.assertEqual(fact(wave.header(48000, 32, nChannels, nFrames=1000)), 1000)
+            self.assertEqual(fact(wave.header(48000, 32, nChannels)), wave.UNKNOWN_SIZE)
+
+class TestRF64(unittest.TestCase):
+    def setUp(self):
+        self.limit = wave.MAX_CHUNK_SIZE
+
+    def tearDown(self):
+        wave.MAX_CHUNK_SIZE = self.limit
+
+    def test_1(self):
+        """ Files growing past the chunk size limit should be promoted to RF64
+            and read back unchanged
+        """
+        wave.MAX_CHUNK_SIZE = 1000
+        samples = [ [0.25]*300 + [-0.5]*300, [1.0]*600 ]
+        for mmap in (False, True):
+            fname = TMP_FILE.format('rf64', 32, 2)
+            with Writer(48000, 32, 2, fname) as wav:
+                wav.write(samples)
+
+            with open(fname, 'rb') as f:
+                self.assertEqual(f.read(4), b'RF64')
+
+            with Reader(fname, mmap=mmap) as wav:
+                self.assertEqual(wav.dataLength, 600)
+                left, right = wav.read(1<<20)
+
+            self.assertEqual(list(left), samples[0])
+            self.assertEqual(list(right), samples[1])
+
+    def test_2(self):
+        """ Files under the chunk size limit should remain RIFF files
+        """
+        fname = TMP_FILE.format('riff', 32, 1)
+        with Writer(48000, 32, 1, fname) as wav:
+            wav.write([[0.0]*100])
+
+        with open(fname, 'rb') as f:
+            self.assertEqual(f.read(4), b'RIFF')